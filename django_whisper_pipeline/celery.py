@@ -11,12 +11,24 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 
 app.conf.beat_schedule = {
+    # Запуски идут по eta, завершение — по последнему файлу; beat только страхует
     "run_ready_tasks": {
         "task": "transcriber.tasks.run_ready_tasks",
-        "schedule": crontab(minute="*/1"),
+        "schedule": crontab(minute="*/5"),
     },
+    # Файлы ставятся в очередь при создании (dispatch_task_files),
+    # beat только подбирает потерянные — на воркере транскрипции (см. CELERY_TASK_ROUTES)
     "process_task_file": {
         "task": "transcriber.tasks.process_task_file",
-        "schedule": crontab(minute="*/1"),
+        "schedule": crontab(minute="*/10"),
+    },
+    # Файлы упавших воркеров возвращаются в очередь по истечении аренды
+    "reap_expired_leases": {
+        "task": "transcriber.tasks.reap_expired_leases",
+        "schedule": crontab(minute="*"),
+    },
+    "clean_transcript_cache": {
+        "task": "transcriber.tasks.clean_transcript_cache",
+        "schedule": crontab(minute=0, hour=3),
     },
 }
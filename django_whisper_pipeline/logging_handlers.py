@@ -1,34 +1,149 @@
 import logging
+import os
+import threading
+
+from celery.signals import task_postrun, worker_process_shutdown, worker_shutdown
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection
+
 from transcriber.models import TaskLog, Task
 
 class TaskDBHandler(logging.Handler):
-    """Логи сохраняются в БД для конкретной задачи (task_id)."""
+    """
+    Логи сохраняются в БД для конкретной задачи (task_id).
+    emit только кладёт запись в буфер в памяти; в БД буфер пишет одним bulk_create
+    фоновый поток — когда записей набралось batch_size или прошло flush_interval секунд.
+    Если буфер заполнен (БД не успевает или недоступна), новые записи отбрасываются —
+    логирование не тормозит обработку и не открывает соединений в рабочих потоках.
+    """
+    def __init__(self, batch_size=100, flush_interval=2.0, max_buffer=10000):
+        super().__init__()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.buffer = []
+        self.dropped = 0
+        self.buffer_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.flusher = None
+        self.flusher_pid = None
+
     def emit(self, record):
         try:
             task_id = getattr(record, "task_id", None)
             if not task_id:
                 return
-            task = Task.objects.filter(id=task_id).first()
-            if not task:
-                return
-            TaskLog.objects.create(
-                task=task,
+            entry = TaskLog(
+                task_id=task_id,
                 level=record.levelname,
                 message=self.format(record),
                 extra=getattr(record, "extra_data", None)
             )
+            with self.buffer_lock:
+                self._ensure_flusher()
+                if len(self.buffer) >= self.max_buffer:
+                    self.dropped += 1
+                    return
+                self.buffer.append(entry)
+                if len(self.buffer) >= self.batch_size:
+                    self.wakeup.set()
+        except Exception:
+            # Не ломаем приложение из-за ошибки логирования
+            pass
+
+    def _ensure_flusher(self):
+        """Запускает фоновый поток записи; после fork (prefork-воркер) — заново в дочернем процессе."""
+        if self.stopping or (self.flusher_pid == os.getpid() and self.flusher.is_alive()):
+            return
+        self.flusher_pid = os.getpid()
+        self.flusher = threading.Thread(target=self._flush_loop, name="task-log-flusher", daemon=True)
+        self.flusher.start()
+
+    def _flush_loop(self):
+        while not self.stopping:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            # соединение у потока своё и держится между записями; битое или старое переоткрываем
+            close_old_connections()
+            self.flush()
+        connection.close()
+
+    def wake(self):
+        """Просит фоновый поток записать буфер, не дожидаясь flush_interval."""
+        self.wakeup.set()
+
+    def stop(self, timeout=5.0):
+        """Останавливает фоновый поток и дописывает остаток буфера (при остановке процесса)."""
+        self.stopping = True
+        self.wakeup.set()
+        if self.flusher is not None and self.flusher_pid == os.getpid() and self.flusher.is_alive():
+            self.flusher.join(timeout)
+        self.flush()
+
+    def flush(self):
+        with self.buffer_lock:
+            entries, self.buffer = self.buffer, []
+            dropped, self.dropped = self.dropped, 0
+        if not entries:
+            return
+        try:
+            if dropped:
+                entries.append(TaskLog(
+                    task_id=entries[-1].task_id,
+                    level="WARNING",
+                    message=f"Буфер логов переполнен, пропущено записей: {dropped}",
+                ))
+            try:
+                TaskLog.objects.bulk_create(entries, batch_size=self.batch_size)
+            except IntegrityError:
+                # задачу успели удалить — пишем только логи существующих задач
+                existing = set(Task.objects.filter(id__in={e.task_id for e in entries}).values_list("id", flat=True))
+                TaskLog.objects.bulk_create([e for e in entries if e.task_id in existing], batch_size=self.batch_size)
         except Exception:
             # Не ломаем приложение из-за ошибки логирования
             pass
 
+
+_db_handler = None
+
+
+def get_db_handler():
+    """Общий для всех задач обработчик: один буфер и одна пачка INSERT на процесс."""
+    global _db_handler
+    if _db_handler is None:
+        _db_handler = TaskDBHandler(
+            batch_size=settings.TASK_LOG_BATCH_SIZE,
+            flush_interval=settings.TASK_LOG_FLUSH_INTERVAL,
+            max_buffer=settings.TASK_LOG_MAX_BUFFER,
+        )
+        _db_handler.setLevel(logging.INFO)
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+        _db_handler.setFormatter(formatter)
+    return _db_handler
+
+
+def flush_task_logs(**kwargs):
+    # запись идёт в фоновом потоке: рабочий поток задачи БД не ждёт
+    if _db_handler is not None:
+        _db_handler.wake()
+
+
+def stop_task_logs(**kwargs):
+    if _db_handler is not None:
+        _db_handler.stop()
+
+
+# Дописываем буфер по окончании каждой celery-задачи и при остановке воркера
+task_postrun.connect(flush_task_logs, weak=False)
+worker_process_shutdown.connect(stop_task_logs, weak=False)
+worker_shutdown.connect(stop_task_logs, weak=False)
+
+
 def get_task_logger(task_id):
     logger = logging.getLogger(f"task_{task_id}")
     if not any(isinstance(h, TaskDBHandler) for h in logger.handlers):
-        handler = TaskDBHandler()
-        handler.setLevel(logging.INFO)
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        logger.addHandler(get_db_handler())
         logger.propagate = False
     # Добавляем task_id в каждый лог
     adapter = logging.LoggerAdapter(logger, extra={"task_id": task_id})
@@ -1,3 +1,4 @@
+import json
 import os
 
 from dotenv import load_dotenv
@@ -33,6 +34,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'django_celery_beat',
     'filer',
@@ -113,9 +115,115 @@ TEMP_DIR = os.getenv("TEMP_DIR", "/tmp/transcriber/input")
 ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "/tmp/transcriber/archive")
 OUTPUT_FILE_NAME = os.getenv("OUTPUT_FILE_NAME", "full_transcript.srt")
 YA_DISK_TOKEN = os.getenv("YA_DISK_TOKEN")
+# Параллельные загрузки с Яндекс.Диска и повторы оборвавшейся загрузки файла
+YA_DISK_DOWNLOAD_WORKERS = int(os.getenv("YA_DISK_DOWNLOAD_WORKERS", 4))
+YA_DISK_DOWNLOAD_RETRIES = int(os.getenv("YA_DISK_DOWNLOAD_RETRIES", 3))
+YA_DISK_DOWNLOAD_RETRY_INTERVAL = float(os.getenv("YA_DISK_DOWNLOAD_RETRY_INTERVAL", 2))
 ALLOWED_EXTS = os.getenv("ALLOWED_EXTS", ".mp3,.wav,.m4a,.ogg")
 LOG_FILE = os.getenv("LOG_FILE", None)
 
+# Запуски задач ближе этого горизонта (сек) ставятся в Celery с eta, дальние — подбирает run_ready_tasks
+TASK_ETA_HORIZON_SEC = int(os.getenv("TASK_ETA_HORIZON_SEC", 600))
+
+# Аренда файла воркером: работающий воркер продлевает её раз в TASK_FILE_HEARTBEAT_SEC.
+# Файл с истёкшей арендой (воркер упал) возвращается в очередь через RETRY_BACKOFF_SEC * 2^(попытка-1),
+# после TASK_FILE_MAX_ATTEMPTS попыток — в ERROR
+TASK_FILE_LEASE_SEC = int(os.getenv("TASK_FILE_LEASE_SEC", 300))
+TASK_FILE_HEARTBEAT_SEC = int(os.getenv("TASK_FILE_HEARTBEAT_SEC", 60))
+TASK_FILE_MAX_ATTEMPTS = int(os.getenv("TASK_FILE_MAX_ATTEMPTS", 3))
+TASK_FILE_RETRY_BACKOFF_SEC = int(os.getenv("TASK_FILE_RETRY_BACKOFF_SEC", 60))
+# Задача, которая дольше этого (сек) висит на подготовке (очистка/скачивание/заполнение), переводится в ERROR
+TASK_PREPARE_TIMEOUT_SEC = int(os.getenv("TASK_PREPARE_TIMEOUT_SEC", 6 * 3600))
+
+# Нарезка аудио перед транскрипцией: "vad" — только речь, "fixed" — равные куски
+TRANSCRIBE_SEGMENTATION = os.getenv("TRANSCRIBE_SEGMENTATION", "vad")
+TRANSCRIBE_CHUNK_LENGTH_SEC = int(os.getenv("TRANSCRIBE_CHUNK_LENGTH_SEC", 30))
+VAD_BACKEND = os.getenv("VAD_BACKEND", "silero")  # silero | energy
+VAD_MAX_SEGMENT_SEC = float(os.getenv("VAD_MAX_SEGMENT_SEC", 30))
+VAD_SPEECH_PAD_MS = int(os.getenv("VAD_SPEECH_PAD_MS", 200))
+VAD_MERGE_GAP_MS = int(os.getenv("VAD_MERGE_GAP_MS", 500))
+# Прогресс длинных файлов сохраняется каждые N распознанных чанков, после сбоя файл продолжается с них
+TRANSCRIBE_CHECKPOINT_INTERVAL = int(os.getenv("TRANSCRIBE_CHECKPOINT_INTERVAL", 5))
+# Файлы не длиннее TRANSCRIBE_SHORT_MAX_SEC идут в очередь transcribe_short, остальные — в transcribe_long.
+# Длительность определяется ffprobe при заполнении файлов задачи в TRANSCRIBE_PROBE_WORKERS потоков
+TRANSCRIBE_SHORT_MAX_SEC = int(os.getenv("TRANSCRIBE_SHORT_MAX_SEC", 600))
+TRANSCRIBE_PROBE_WORKERS = int(os.getenv("TRANSCRIBE_PROBE_WORKERS", 8))
+# Микробатчи: клипы не длиннее TRANSCRIBE_MICROBATCH_MAX_SEC захватываются пачками по TRANSCRIBE_MICROBATCH_SIZE
+# и распознаются одним проходом модели (0 или 1 — каждый файл отдельно)
+TRANSCRIBE_MICROBATCH_SIZE = int(os.getenv("TRANSCRIBE_MICROBATCH_SIZE", 16))
+TRANSCRIBE_MICROBATCH_MAX_SEC = int(os.getenv("TRANSCRIBE_MICROBATCH_MAX_SEC", 30))
+# Модели Whisper: ключ -> параметры WhisperModel. model — имя (tiny, small, large-v3...) или путь к каталогу.
+# memory_mb (необязательно) — оценка памяти под модель для лимита кэша.
+# Можно переопределить целиком JSON-ом в переменной WHISPER_MODELS.
+WHISPER_MODELS = json.loads(os.getenv("WHISPER_MODELS", "null")) or {
+    "default": {
+        "model": os.getenv("WHISPER_MODEL", "tiny"),
+        "device": "cpu",
+        "compute_type": os.getenv("WHISPER_COMPUTE_TYPE", "int8"),
+        "cpu_threads": int(os.getenv("WHISPER_CPU_THREADS", 0)),
+        "num_workers": int(os.getenv("WHISPER_NUM_WORKERS", 1)),
+        "download_root": os.getenv("WHISPER_DOWNLOAD_ROOT") or None,
+    },
+}
+WHISPER_DEFAULT_MODEL = os.getenv("WHISPER_DEFAULT_MODEL", "default")
+# Модели, которые загружаются при старте воркера транскрипции (-Q transcribe_*), а не на первом файле
+WHISPER_PRELOAD_MODELS = [m for m in os.getenv("WHISPER_PRELOAD_MODELS", WHISPER_DEFAULT_MODEL).split(",") if m]
+# Сколько моделей держать в памяти процесса одновременно и сколько памяти они могут занять
+WHISPER_MODEL_CACHE_SIZE = int(os.getenv("WHISPER_MODEL_CACHE_SIZE", 2))
+WHISPER_MODEL_CACHE_MEMORY_MB = int(os.getenv("WHISPER_MODEL_CACHE_MEMORY_MB", 4096))
+# Профили декодирования: ключ -> параметры model.transcribe (beam_size, best_of, temperature,
+# without_timestamps, condition_on_previous_text) и, необязательно, model — ключ из WHISPER_MODELS.
+# Можно переопределить целиком JSON-ом в переменной WHISPER_DECODING_PROFILES.
+WHISPER_DECODING_PROFILES = json.loads(os.getenv("WHISPER_DECODING_PROFILES", "null")) or {
+    # черновик: жадный поиск без повторов с температурой, примерно в несколько раз быстрее
+    "fast": {
+        "beam_size": 1,
+        "best_of": 1,
+        "temperature": [0.0],
+        "without_timestamps": True,
+        "condition_on_previous_text": False,
+    },
+    "balanced": {
+        "beam_size": 3,
+        "best_of": 3,
+        "temperature": [0.0, 0.4, 0.8],
+        "without_timestamps": False,
+        "condition_on_previous_text": True,
+    },
+    # значения faster-whisper по умолчанию
+    "accurate": {
+        "beam_size": 5,
+        "best_of": 5,
+        "temperature": [0.0, 0.2, 0.4, 0.6, 0.8, 1.0],
+        "without_timestamps": False,
+        "condition_on_previous_text": True,
+    },
+}
+WHISPER_DEFAULT_DECODING_PROFILE = os.getenv("WHISPER_DEFAULT_DECODING_PROFILE", "accurate")
+
+# Сколько сегментов файла декодировать за один проход (0 или 1 — по одному).
+# В пакетном режиме TRANSCRIBE_CHUNK_LENGTH_SEC и VAD_MAX_SEGMENT_SEC ограничиваются 30 с (окно Whisper)
+WHISPER_BATCH_SIZE = int(os.getenv("WHISPER_BATCH_SIZE", 0))
+# Длинные файлы (от TRANSCRIBE_PARALLEL_MIN_SEC) распознаются в TRANSCRIBE_PARALLEL_PROCESSES процессах
+# (0 или 1 — в самом воркере). Каждый процесс держит свою модель с cpu_threads = TRANSCRIBE_CPU_BUDGET // процессов.
+# Работает в пулах solo/threads: дочерние процессы prefork-пула не могут создавать свои
+TRANSCRIBE_PARALLEL_PROCESSES = int(os.getenv("TRANSCRIBE_PARALLEL_PROCESSES", 0))
+TRANSCRIBE_PARALLEL_MIN_SEC = int(os.getenv("TRANSCRIBE_PARALLEL_MIN_SEC", 1800))
+TRANSCRIBE_CPU_BUDGET = int(os.getenv("TRANSCRIBE_CPU_BUDGET", os.cpu_count() or 1))
+
+# Кэш транскрипций по хэшу аудио: одинаковые файлы не распознаются повторно
+TRANSCRIPT_CACHE_ENABLED = os.getenv("TRANSCRIPT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+TRANSCRIPT_CACHE_MAX_AGE_DAYS = int(os.getenv("TRANSCRIPT_CACHE_MAX_AGE_DAYS", 90))
+TRANSCRIPT_CACHE_MAX_ENTRIES = int(os.getenv("TRANSCRIPT_CACHE_MAX_ENTRIES", 100000))
+
+# Конфигурация полнотекстового поиска PostgreSQL по транскрипциям
+TRANSCRIPT_SEARCH_CONFIG = os.getenv("TRANSCRIPT_SEARCH_CONFIG", "russian")
+
+# Логи задач в БД пишутся пачками: по размеру пачки или раз в интервал (сек)
+TASK_LOG_BATCH_SIZE = int(os.getenv("TASK_LOG_BATCH_SIZE", 100))
+TASK_LOG_FLUSH_INTERVAL = float(os.getenv("TASK_LOG_FLUSH_INTERVAL", 2))
+TASK_LOG_MAX_BUFFER = int(os.getenv("TASK_LOG_MAX_BUFFER", 10000))
+
 LOG_DIR = os.path.join(BASE_DIR, "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 
@@ -143,6 +251,23 @@ LOGGING = {
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
 CELERY_RESULT_BACKEND = CELERY_BROKER_URL
 CELERY_TIMEZONE = "Europe/Moscow"
+# Скачивание и транскрипция коротких/длинных файлов идут в разных очередях,
+# чтобы длинная запись не задерживала короткие (воркеры слушают нужные очереди через -Q).
+# В очереди по умолчанию (celery) остаются только служебные задачи: запуск, очистка, reaper.
+# dispatch_task_files выбирает очередь файла явно; здесь — очереди для вызовов без неё
+# (страховочный проход process_task_file по beat и его повторная постановка)
+CELERY_TASK_ROUTES = {
+    "transcriber.tasks.fetch_task_stage": {"queue": "download"},
+    # заполнение прогоняет ffprobe по всем новым файлам — тоже не на служебном воркере
+    "transcriber.tasks.fill_task_stage": {"queue": "download"},
+    "transcriber.tasks.process_task_file": {"queue": "transcribe_long"},
+    "transcriber.tasks.process_short_batch": {"queue": "transcribe_short"},
+}
+# приоритет сообщений в Redis: 0 — самый высокий
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "queue_order_strategy": "priority",
+    "priority_steps": list(range(10)),
+}
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -152,6 +277,9 @@ PROJECT_ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), os.p
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Временные файлы загрузок лежат на том же диске, что и медиа: в хранилище они переносятся, а не копируются
+FILE_UPLOAD_TEMP_DIR = os.path.join(MEDIA_ROOT, 'tmp')
+os.makedirs(FILE_UPLOAD_TEMP_DIR, exist_ok=True)
 
 DATABASES = {
     'default': {
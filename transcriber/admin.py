@@ -1,20 +1,59 @@
 
+from django.conf import settings
 from django.contrib import admin
-from django.http.response import HttpResponse
+from django.contrib.postgres.search import SearchHeadline, SearchQuery
+from django.db.models import Q
+from django.http.response import HttpResponse, StreamingHttpResponse
 from django.urls.base import reverse
 from django.urls.conf import path
-from django.utils.html import format_html
+from django.utils.html import escape, format_html
+from django.utils.safestring import mark_safe
 
-from .models import Task, TaskHistory, TaskLog, TaskFile
+from .exports import EXPORT_FORMATS, iter_task_results
+from .models import Task, TaskHistory, TaskLog, TaskFile, TranscriptCache, TranscriptSegment
+from .tasks import schedule_task_run, start_task
 
 @admin.register(TaskFile)
 class TaskFileAdmin(admin.ModelAdmin):
     list_display = (
-        "id", "task__name", "status"
+        "id", "task__name", "status", "duration", "language", "attempts", "lease_expires_at", "search_headline"
     )
     list_filter = ("task", "status")
     search_fields = ("task__name", )
 
+    def get_search_results(self, request, queryset, search_term):
+        """Кроме имени задачи ищем по тексту транскрипций через полнотекстовый индекс."""
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        by_name, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        by_text = queryset.search(search_term).values("pk")
+        return queryset.filter(Q(pk__in=by_name.values("pk")) | Q(pk__in=by_text)), may_have_duplicates
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        search_term = request.GET.get("q")
+        if search_term:
+            # подсвеченный фрагмент транскрипции для колонки списка
+            queryset = queryset.annotate(
+                headline=SearchHeadline(
+                    "result_text",
+                    SearchQuery(search_term, config=settings.TRANSCRIPT_SEARCH_CONFIG, search_type="websearch"),
+                    config=settings.TRANSCRIPT_SEARCH_CONFIG,
+                    start_sel="<b>",
+                    stop_sel="</b>",
+                )
+            )
+        return queryset
+
+    def search_headline(self, obj):
+        headline = getattr(obj, "headline", None)
+        if not headline:
+            return "-"
+        # текст экранируем, оставляя только подсветку совпадений
+        highlighted = escape(headline).replace("&lt;b&gt;", "<b>").replace("&lt;/b&gt;", "</b>")
+        return mark_safe(highlighted)
+    search_headline.short_description = "Фрагмент"
+
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
     list_display = (
@@ -31,6 +70,9 @@ class TaskAdmin(admin.ModelAdmin):
     search_fields = ("name", "ya_disk_path")
     readonly_fields = (
         "last_run",
+        "next_run_at",
+        "pending_files",
+        "failed_files",
         "created_at",
         "updated_at",
         "folder_link",
@@ -39,9 +81,10 @@ class TaskAdmin(admin.ModelAdmin):
 
     fieldsets = (
         ("Основное", {"fields": ("name", "task_type", "source_type")}),
-        ("Источник данных", {"fields": ("ya_disk_path", "folder", "folder_link")}),
-        ("Запуск задачи", {"fields": ("run_once_at", "interval", "interval_type")}),
-        ("Результат и статус", {"fields": ("status", "last_error", "last_run")}),
+        ("Источник данных", {"fields": ("ya_disk_path", "sync_mode", "folder", "folder_link")}),
+        ("Запуск задачи", {"fields": ("run_once_at", "interval", "interval_type", "next_run_at")}),
+        ("Транскрипция", {"fields": ("language", "whisper_model", "decoding_profile", "batch_size", "priority")}),
+        ("Результат и статус", {"fields": ("status", "pending_files", "failed_files", "last_error", "last_run")}),
         ("Служебное", {"fields": ("created_at", "updated_at", "meta")}),
     )
 
@@ -57,12 +100,19 @@ class TaskAdmin(admin.ModelAdmin):
     folder_link.short_description = "Папка с файлами"
 
     def next_run_display(self, obj):
-        if obj.task_type == obj.TaskType.PERIODIC:
-            return obj.next_run_time()
-        elif obj.task_type == obj.TaskType.ONE_TIME:
-            return obj.run_once_at
-        return "-"
+        return obj.next_run_at or "-"
     next_run_display.short_description = "Следующий запуск"
+    next_run_display.admin_order_field = "next_run_at"
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        schedule_task_run(obj)
+
+    @admin.action(description="Запустить сейчас")
+    def run_task_now(self, request, queryset):
+        for task in queryset:
+            start_task.delay(str(task.id), force=True)
+        self.message_user(request, f"Поставлено в очередь задач: {queryset.count()}")
 
     def get_urls(self):
         urls = super().get_urls()
@@ -80,33 +130,36 @@ class TaskAdmin(admin.ModelAdmin):
         if not obj.files.filter(status=TaskFile.Status.DONE).exists():
             return "-"
         url = reverse("admin:task_download_results", args=[obj.id])
-        return format_html('<a class="button" href="{}">📥 Скачать результаты</a>', url)
+        return format_html(
+            '<a class="button" href="{}">📥 Скачать результаты</a> '
+            '<a href="{}?format=zip">zip</a> <a href="{}?format=srt">srt</a> <a href="{}?format=vtt">vtt</a>',
+            url, url, url, url,
+        )
 
     download_results_button.short_description = "Результаты"
     download_results_button.allow_tags = True
 
     def download_results_view(self, request, task_id):
-        """Формируем zip-архив со всеми результатами файлов задачи."""
+        """
+        Выгрузка результатов файлов задачи: ?format=txt (общий текст, по умолчанию),
+        zip (txt на каждый файл), srt или vtt (субтитры на каждый файл в zip).
+        Ответ отдаётся потоком, результаты читаются из БД порциями.
+        """
         task = self.get_object(request, task_id)
         if not task:
             return HttpResponse("Задача не найдена", status=404)
 
-        task_files = TaskFile.objects.filter(task=task, status=TaskFile.Status.DONE).select_related("filer_file")
-        if not task_files.exists():
-            return HttpResponse("Нет готовых файлов для выгрузки.", status=400)
-
-        # Формируем общий текст
-        result_lines = []
-        for tf in task_files:
-            header = f"===== {tf.filer_file.original_filename} =====\n"
-            text = tf.result_text or "[пусто]"
-            result_lines.append(header + text + "\n\n")
+        export_format = request.GET.get("format", "txt")
+        if export_format not in EXPORT_FORMATS:
+            return HttpResponse(f"Неизвестный формат выгрузки: {export_format}", status=400)
 
-        combined_text = "".join(result_lines)
+        if not TaskFile.objects.filter(task=task, status=TaskFile.Status.DONE).exists():
+            return HttpResponse("Нет готовых файлов для выгрузки.", status=400)
 
-        # Возвращаем txt-файл как attachment
-        response = HttpResponse(combined_text, content_type="text/plain; charset=utf-8")
-        response["Content-Disposition"] = f'attachment; filename="task_{task.id}_results.txt"'
+        extension, content_type = EXPORT_FORMATS[export_format]
+        suffix = "" if export_format in ("txt", "zip") else f"_{export_format}"
+        response = StreamingHttpResponse(iter_task_results(task, export_format), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="task_{task.id}_results{suffix}.{extension}"'
         return response
 
 @admin.register(TaskHistory)
@@ -123,4 +176,18 @@ class TaskHistoryAdmin(admin.ModelAdmin):
 class TaskLogAdmin(admin.ModelAdmin):
     list_display = ("task", "level", "created_at", "message")
     list_filter = ("task", "level", "created_at")
-    search_fields = ("message", "task__name")
\ No newline at end of file
+    search_fields = ("message", "task__name")
+
+@admin.register(TranscriptCache)
+class TranscriptCacheAdmin(admin.ModelAdmin):
+    list_display = ("audio_sha256", "created_at", "last_used_at")
+    search_fields = ("audio_sha256", "key")
+    readonly_fields = ("key", "audio_sha256", "params", "created_at", "last_used_at")
+
+@admin.register(TranscriptSegment)
+class TranscriptSegmentAdmin(admin.ModelAdmin):
+    list_display = ("task_file", "start", "end", "text", "avg_logprob", "no_speech_prob")
+    list_select_related = ("task_file",)
+    search_fields = ("text",)
+    raw_id_fields = ("task_file",)
+    readonly_fields = ("task_file", "start", "end", "text", "avg_logprob", "no_speech_prob")
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import subprocess
+import tempfile
+from typing import TYPE_CHECKING, Iterator, List, NamedTuple, Optional, Tuple
+
+# numpy нужен только при декодировании: веб и beat, импортирующие задачи, его не грузят
+if TYPE_CHECKING:
+    import numpy as np
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # s16le
+
+
+class AudioChunk(NamedTuple):
+    """Фрагмент декодированного аудио: смещение от начала файла (сек) и 16 кГц mono PCM в float32."""
+    start: float
+    audio: np.ndarray
+
+    @property
+    def duration(self) -> float:
+        return len(self.audio) / SAMPLE_RATE
+
+    @property
+    def end(self) -> float:
+        return self.start + self.duration
+
+
+def probe_duration(file_path: str) -> float:
+    """Длительность файла в секундах по данным ffprobe."""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+         "-of", "default=noprint_wrappers=1:nokey=1", file_path],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.strip())
+
+
+def iter_audio_chunks(file_path: str, chunk_length_sec: int = 30, start_sec: float = 0.0) -> Iterator[AudioChunk]:
+    """
+    Декодирует файл одним процессом ffmpeg и отдаёт его чанками фиксированной длины.
+    ffmpeg пишет 16 кГц mono PCM в pipe, чанки читаются по одному — в памяти
+    держится только текущий чанк, временные файлы не создаются.
+    start_sec > 0 — декодирование начинается с этой позиции (продолжение после сбоя).
+    Если генератор закрыли раньше времени (исключение, break), ffmpeg убивается.
+    """
+    import numpy as np
+
+    chunk_bytes = int(chunk_length_sec * SAMPLE_RATE) * SAMPLE_WIDTH
+    # -ss перед -i: ffmpeg перематывает вход, а не декодирует всё до нужного места
+    seek = ["-ss", f"{start_sec:.3f}"] if start_sec > 0 else []
+
+    # stderr пишем в анонимный файл, а не в PIPE: при большом количестве ошибок
+    # декодирования ffmpeg заблокировался бы на записи в stderr
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(
+            [
+                "ffmpeg",
+                "-hide_banner",
+                "-nostdin",
+                "-loglevel", "error",
+                *seek,
+                "-i", file_path,
+                "-vn",
+                "-f", "s16le",
+                "-acodec", "pcm_s16le",
+                "-ar", str(SAMPLE_RATE),  # частота дискретизации
+                "-ac", "1",  # моно
+                "pipe:1",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+        )
+        try:
+            offset = float(start_sec)
+            while True:
+                data = process.stdout.read(chunk_bytes)
+                # последний неполный сэмпл (нечётное число байт) отбрасываем
+                data = data[:len(data) - len(data) % SAMPLE_WIDTH]
+                if not data:
+                    break
+                audio = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+                chunk = AudioChunk(offset, audio)
+                offset = chunk.end
+                yield chunk
+
+            if process.wait() != 0:
+                stderr.seek(0)
+                message = stderr.read().decode(errors="replace").strip()
+                raise RuntimeError(f"ffmpeg завершился с кодом {process.returncode}: {message}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+
+
+def _energy_speech_spans(audio: np.ndarray, frame_ms: int = 30, min_speech_ms: int = 250) -> List[Tuple[int, int]]:
+    """
+    Простой энергетический VAD: кадры, чья громкость заметно выше шумового фона окна.
+    Возвращает интервалы речи в сэмплах без паддинга и склейки.
+    """
+    import numpy as np
+
+    frame = SAMPLE_RATE * frame_ms // 1000
+    n_frames = len(audio) // frame
+    if not n_frames:
+        return []
+
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    rms_db = 20 * np.log10(np.sqrt(np.mean(frames ** 2, axis=1)) + 1e-10)
+    # порог: на 10 дБ выше тихих 10% кадров, но не ниже -55 dBFS
+    threshold = max(np.percentile(rms_db, 10) + 10, -55.0)
+    voiced = rms_db > threshold
+
+    spans = []
+    start = None
+    for i, is_voiced in enumerate(voiced):
+        if is_voiced and start is None:
+            start = i
+        elif not is_voiced and start is not None:
+            spans.append((start * frame, i * frame))
+            start = None
+    if start is not None:
+        spans.append((start * frame, n_frames * frame))
+
+    min_speech = SAMPLE_RATE * min_speech_ms // 1000
+    return [(s, e) for s, e in spans if e - s >= min_speech]
+
+
+def _shape_spans(spans, length, max_segment_sec, speech_pad_ms, merge_gap_ms) -> List[Tuple[int, int]]:
+    """Склеивает интервалы с паузой короче merge_gap, добавляет паддинг и режет по max_segment_sec."""
+    pad = SAMPLE_RATE * speech_pad_ms // 1000
+    gap = SAMPLE_RATE * merge_gap_ms // 1000
+    max_len = int(SAMPLE_RATE * max_segment_sec)
+
+    merged = []
+    for s, e in spans:
+        s, e = max(0, s - pad), min(length, e + pad)
+        if merged and s - merged[-1][1] <= gap and e - merged[-1][0] <= max_len:
+            merged[-1] = (merged[-1][0], e)
+        else:
+            merged.append((s, e))
+
+    shaped = []
+    for s, e in merged:
+        while e - s > max_len:
+            shaped.append((s, s + max_len))
+            s += max_len
+        shaped.append((s, e))
+    return shaped
+
+
+def _speech_spans(audio, backend, max_segment_sec, speech_pad_ms, merge_gap_ms) -> List[Tuple[int, int]]:
+    if backend == "silero":
+        from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+        options = VadOptions(
+            max_speech_duration_s=max_segment_sec,
+            min_silence_duration_ms=merge_gap_ms,
+            speech_pad_ms=speech_pad_ms,
+        )
+        return [(ts["start"], ts["end"]) for ts in get_speech_timestamps(audio, options)]
+
+    return _shape_spans(_energy_speech_spans(audio), len(audio), max_segment_sec, speech_pad_ms, merge_gap_ms)
+
+
+def iter_speech_chunks(
+    file_path: str,
+    report: Optional[dict] = None,
+    backend: str = "silero",
+    max_segment_sec: float = 30,
+    speech_pad_ms: int = 200,
+    merge_gap_ms: int = 500,
+    window_sec: int = 300,
+    start_sec: float = 0.0,
+) -> Iterator[AudioChunk]:
+    """
+    Отдаёт только фрагменты с речью (VAD), не длиннее max_segment_sec.
+    Файл декодируется окнами по window_sec; речь, которая не закончилась к концу окна,
+    переносится в следующее, поэтому слова на границах окон не режутся.
+    backend — "silero" (VAD из faster-whisper) или "energy" (по громкости).
+    start_sec > 0 — обработка начинается с этой позиции файла.
+    В report (если передан) пишется, сколько аудио было и сколько пропущено как тишина.
+    """
+    import numpy as np
+
+    if backend == "silero":
+        try:
+            import faster_whisper.vad  # noqa: F401
+        except ImportError:
+            backend = "energy"
+
+    tail = SAMPLE_RATE * (speech_pad_ms + merge_gap_ms) // 1000
+    total_sec = speech_sec = 0.0
+    segments = 0
+
+    carry = np.zeros(0, dtype=np.float32)
+    carry_start = float(start_sec)
+    windows = iter_audio_chunks(file_path, chunk_length_sec=window_sec, start_sec=start_sec)
+    window = next(windows, None)
+    while window is not None:
+        next_window = next(windows, None)
+        is_last = next_window is None
+        total_sec += window.duration
+
+        buffer = np.concatenate([carry, window.audio]) if len(carry) else window.audio
+        buffer_start = carry_start if len(carry) else window.start
+        spans = _speech_spans(buffer, backend, max_segment_sec, speech_pad_ms, merge_gap_ms)
+
+        cut = len(buffer)
+        if not is_last:
+            # хвост окна оставляем на следующее: либо начавшуюся у границы речь,
+            # либо последние tail сэмплов, где речь может только начинаться
+            if spans and spans[-1][1] >= len(buffer) - tail:
+                cut = spans[-1][0]
+            else:
+                cut = max(0, len(buffer) - tail)
+
+        for s, e in spans:
+            if e > cut:
+                break
+            chunk = AudioChunk(buffer_start + s / SAMPLE_RATE, buffer[s:e].copy())
+            speech_sec += chunk.duration
+            segments += 1
+            yield chunk
+
+        carry = buffer[cut:].copy()
+        carry_start = buffer_start + cut / SAMPLE_RATE
+        window = next_window
+
+    if report is not None:
+        report.update({
+            "backend": backend,
+            "total_sec": round(total_sec, 2),
+            "speech_sec": round(speech_sec, 2),
+            "skipped_sec": round(max(0.0, total_sec - speech_sec), 2),
+            "segments": segments,
+        })
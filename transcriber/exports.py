@@ -0,0 +1,134 @@
+import os
+import zipfile
+
+from transcriber.models import TaskFile, TranscriptSegment
+
+# формат выгрузки -> (расширение файла ответа, content-type)
+EXPORT_FORMATS = {
+    "txt": ("txt", "text/plain; charset=utf-8"),
+    "zip": ("zip", "application/zip"),
+    "srt": ("zip", "application/zip"),
+    "vtt": ("zip", "application/zip"),
+}
+
+
+class _ZipStream:
+    """Файлоподобный приёмник для zipfile без seek: записанное забирается кусками через pop()."""
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def iter_zip(entries):
+    """Потоково собирает zip из пар (имя, итератор байтовых кусков) — архив целиком в памяти не лежит."""
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, parts in entries:
+            with archive.open(name, "w") as entry:
+                for part in parts:
+                    entry.write(part)
+                    yield stream.pop()
+            yield stream.pop()
+    yield stream.pop()
+
+
+def _srt_time(seconds):
+    import pysrt
+
+    return pysrt.SubRipTime.from_ordinal(int(round(seconds * 1000)))
+
+
+def _vtt_time(seconds):
+    return str(_srt_time(seconds)).replace(",", ".")
+
+
+def iter_srt(segments):
+    import pysrt
+
+    for index, (start, end, text) in enumerate(segments, start=1):
+        item = pysrt.SubRipItem(index, start=_srt_time(start), end=_srt_time(end), text=text)
+        yield f"{item}\n".encode()
+
+
+def iter_vtt(segments):
+    yield b"WEBVTT\n\n"
+    for start, end, text in segments:
+        yield f"{_vtt_time(start)} --> {_vtt_time(end)}\n{text}\n\n".encode()
+
+
+def _done_files(task, with_text=True):
+    """Готовые файлы задачи без загрузки моделей целиком: (id, имя исходника, текст или None)."""
+    fields = ["id", "filer_file__original_filename"] + (["result_text"] if with_text else [])
+    rows = (
+        TaskFile.objects
+        .filter(task=task, status=TaskFile.Status.DONE)
+        .order_by("created_at")
+        .values_list(*fields)
+        .iterator(chunk_size=100)
+    )
+    for row in rows:
+        yield row if with_text else (*row, None)
+
+
+def _segments(task_file_id):
+    return (
+        TranscriptSegment.objects
+        .filter(task_file_id=task_file_id)
+        .order_by("start")
+        .values_list("start", "end", "text")
+        .iterator(chunk_size=1000)
+    )
+
+
+def _entry_names(files, extension):
+    """Уникальные имена файлов внутри архива по именам исходников."""
+    seen = set()
+    for task_file_id, filename, text in files:
+        stem = os.path.splitext(filename or str(task_file_id))[0]
+        name = f"{stem}.{extension}"
+        counter = 1
+        while name in seen:
+            counter += 1
+            name = f"{stem}_{counter}.{extension}"
+        seen.add(name)
+        yield name, task_file_id, text
+
+
+def iter_task_results(task, export_format):
+    """Байтовые куски выгрузки результатов задачи в формате export_format (см. EXPORT_FORMATS)."""
+    files = _done_files(task, with_text=export_format in ("txt", "zip"))
+
+    if export_format == "txt":
+        for task_file_id, filename, text in files:
+            yield f"===== {filename} =====\n{text or '[пусто]'}\n\n".encode()
+        return
+
+    if export_format == "zip":
+        entries = (
+            (name, iter([(text or "").encode()]))
+            for name, task_file_id, text in _entry_names(files, "txt")
+        )
+    elif export_format == "srt":
+        entries = ((name, iter_srt(_segments(task_file_id))) for name, task_file_id, _ in _entry_names(files, "srt"))
+    elif export_format == "vtt":
+        entries = ((name, iter_vtt(_segments(task_file_id))) for name, task_file_id, _ in _entry_names(files, "vtt"))
+    else:
+        raise ValueError(f"Неизвестный формат выгрузки: {export_format}")
+
+    yield from iter_zip(entries)
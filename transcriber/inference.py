@@ -0,0 +1,193 @@
+import dataclasses
+import logging
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
+
+from celery.signals import worker_process_init, worker_ready
+from django.conf import settings
+
+from transcriber.audio import AudioChunk
+
+logger = logging.getLogger(__name__)
+
+# Примерный объём памяти под модель (МБ), если в описании модели не задан memory_mb
+MODEL_MEMORY_MB = {
+    "tiny": 150,
+    "base": 300,
+    "small": 900,
+    "medium": 2200,
+    "large": 4500,
+}
+DEFAULT_MODEL_MEMORY_MB = 2000
+
+# Загруженные модели процесса: ключ из WHISPER_MODELS -> (модель, оценка памяти), в порядке LRU
+_models = OrderedDict()
+_models_lock = threading.Lock()
+
+
+def get_model_definition(name=None):
+    """Описание модели из WHISPER_MODELS; пустое имя — модель по умолчанию."""
+    name = name or settings.WHISPER_DEFAULT_MODEL
+    try:
+        return name, dict(settings.WHISPER_MODELS[name])
+    except KeyError:
+        raise ValueError(f"Модель Whisper {name!r} не описана в WHISPER_MODELS")
+
+
+def get_decoding_profile(name=None):
+    """Профиль декодирования из WHISPER_DECODING_PROFILES; пустое имя — профиль по умолчанию."""
+    name = name or settings.WHISPER_DEFAULT_DECODING_PROFILE
+    try:
+        return name, dict(settings.WHISPER_DECODING_PROFILES[name])
+    except KeyError:
+        raise ValueError(f"Профиль декодирования {name!r} не описан в WHISPER_DECODING_PROFILES")
+
+
+def _model_memory_mb(definition):
+    if definition.get("memory_mb"):
+        return definition["memory_mb"]
+    model = str(definition["model"]).rsplit("/", 1)[-1]
+    for prefix, memory_mb in MODEL_MEMORY_MB.items():
+        if model.startswith(prefix) or model.startswith(f"distil-{prefix}"):
+            return memory_mb
+    return DEFAULT_MODEL_MEMORY_MB
+
+
+def _evict_models(memory_mb):
+    """Выгружает давно не использованные модели, чтобы влезла ещё одна размером memory_mb."""
+    while _models and (
+        len(_models) >= settings.WHISPER_MODEL_CACHE_SIZE
+        or sum(m for _, m in _models.values()) + memory_mb > settings.WHISPER_MODEL_CACHE_MEMORY_MB
+    ):
+        name, _ = _models.popitem(last=False)
+        logger.info(f"[get_whisper_model] Выгружаем модель {name}")
+
+
+def create_whisper_model(definition, cpu_threads=None):
+    """Новая модель WhisperModel по описанию из WHISPER_MODELS (без кэша)."""
+    from faster_whisper import WhisperModel
+
+    return WhisperModel(
+        definition["model"],
+        device=definition.get("device", "cpu"),
+        compute_type=definition.get("compute_type", "int8"),
+        cpu_threads=definition.get("cpu_threads", 0) if cpu_threads is None else cpu_threads,
+        num_workers=definition.get("num_workers", 1),
+        download_root=definition.get("download_root"),
+    )
+
+
+def get_whisper_model(name=None):
+    """
+    Модель Whisper по ключу из WHISPER_MODELS. Загруженные модели кэшируются в процессе
+    (LRU, не больше WHISPER_MODEL_CACHE_SIZE штук и WHISPER_MODEL_CACHE_MEMORY_MB памяти).
+    """
+    name, definition = get_model_definition(name)
+    with _models_lock:
+        if name in _models:
+            _models.move_to_end(name)
+            return _models[name][0]
+
+        memory_mb = _model_memory_mb(definition)
+        _evict_models(memory_mb)
+
+        logger.info(f"[get_whisper_model] Загружаем модель {name} ({definition['model']})...")
+        model = create_whisper_model(definition)
+        _models[name] = (model, memory_mb)
+        logger.info(f"[get_whisper_model] Модель {name} успешно загружена")
+        return model
+
+
+def preload_whisper_models():
+    for name in settings.WHISPER_PRELOAD_MODELS:
+        try:
+            get_whisper_model(name)
+        except Exception:
+            logger.exception(f"[preload_whisper_models] Не удалось загрузить модель {name}")
+
+
+def consumes_transcribe_queues():
+    """
+    Слушает ли воркер очереди транскрипции (-Q). Служебному воркеру и воркеру скачивания
+    модели не нужны: предзагрузка только заняла бы память.
+    """
+    from celery import current_app
+
+    return any(name.startswith("transcribe_") for name in current_app.amqp.queues.consume_from)
+
+
+@worker_process_init.connect
+def preload_in_pool_process(**kwargs):
+    """prefork: модели грузятся в каждом дочернем процессе до первой задачи."""
+    if consumes_transcribe_queues():
+        preload_whisper_models()
+
+
+@worker_ready.connect
+def preload_in_main_process(sender=None, **kwargs):
+    """solo/threads: задачи выполняются в главном процессе воркера, грузим модели в нём."""
+    pool_cls = getattr(getattr(sender, "controller", None), "pool_cls", None)
+    if pool_cls is not None and not pool_cls.__module__.endswith("prefork") and consumes_transcribe_queues():
+        preload_whisper_models()
+
+
+def detect_language(model, audio):
+    """Язык фрагмента аудио и его вероятность (один проход энкодера по первому окну)."""
+    language, probability, _ = model.detect_language(audio=audio)
+    return language, probability
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def transcribe_chunks(model, chunks: Iterable[AudioChunk], batch_size: int = 0, **options) -> Iterator[Tuple[AudioChunk, List]]:
+    """
+    Транскрибирует чанки и отдаёт пары (чанк, сегменты) строго в порядке чанков.
+    Время сегментов — относительно начала своего чанка, как у model.transcribe.
+
+    batch_size <= 1 — каждый чанк отдельным вызовом model.transcribe.
+    batch_size > 1 — чанки собираются пачками и идут через BatchedInferencePipeline:
+    пачка склеивается в один массив, границы чанков передаются как clip_timestamps,
+    и энкодер/декодер обрабатывают их за один проход. Чанки должны быть не длиннее окна
+    Whisper (30 с): от каждого клипа пайплайн распознаёт только первое окно.
+    """
+    if batch_size <= 1:
+        for chunk in chunks:
+            segments, info = model.transcribe(chunk.audio, **options)
+            yield chunk, list(segments)
+        return
+
+    import numpy as np
+    from faster_whisper import BatchedInferencePipeline
+
+    pipeline = BatchedInferencePipeline(model)
+    for batch in _batched(chunks, batch_size):
+        offsets = []
+        position = 0.0
+        for chunk in batch:
+            offsets.append(position)
+            position += chunk.duration
+
+        segments, info = pipeline.transcribe(
+            np.concatenate([chunk.audio for chunk in batch]),
+            clip_timestamps=[
+                {"start": offset, "end": offset + chunk.duration} for offset, chunk in zip(offsets, batch)
+            ],
+            batch_size=batch_size,
+            **options,
+        )
+
+        # раскладываем сегменты обратно по чанкам и переводим время в систему чанка
+        per_chunk = [[] for _ in batch]
+        for seg in segments:
+            index = max(0, bisect_right(offsets, seg.start + 1e-3) - 1)
+            offset = offsets[index]
+            per_chunk[index].append(dataclasses.replace(seg, start=seg.start - offset, end=seg.end - offset))
+
+        yield from zip(batch, per_chunk)
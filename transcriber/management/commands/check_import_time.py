@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Модули, которые импортируются в вебе, beat и manage.py (через админку, autodiscover и команды)
+LIGHT_MODULES = ["transcriber.admin", "transcriber.tasks", "transcriber.exports"]
+
+# Тяжёлые зависимости транскрипции: нужны только в коде воркера, который распознаёт аудио
+HEAVY_MODULES = {
+    "faster_whisper", "ctranslate2", "av", "onnxruntime", "tokenizers",
+    "huggingface_hub", "numpy", "yadisk", "pysrt",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет время импорта модулей приложения (python -X importtime) "
+        "и падает, если в них попали тяжёлые зависимости или превышен бюджет времени"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--budget-ms", type=float, default=3000, help="Допустимое суммарное время импорта, мс")
+        parser.add_argument("--top", type=int, default=15, help="Сколько самых медленных модулей показать")
+
+    def handle(self, *args, **options):
+        code = f"import django; django.setup(); import {', '.join(LIGHT_MODULES)}"
+        env = dict(os.environ)
+        env.setdefault("DJANGO_SETTINGS_MODULE", "django_whisper_pipeline.settings")
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            env=env,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Импорт завершился с ошибкой:\n{result.stderr[-2000:]}")
+
+        # строки вида "import time:  self [us] | cumulative | imported package"
+        timings = []
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            own, _, name = line[len("import time:"):].split("|")
+            timings.append((int(own), name.strip()))
+
+        total_ms = sum(own for own, _ in timings) / 1000
+        self.stdout.write(f"Импортировано модулей: {len(timings)}, суммарно {total_ms:.0f} мс")
+        for own, name in sorted(timings, reverse=True)[:options["top"]]:
+            self.stdout.write(f"  {own / 1000:8.1f} мс  {name}")
+
+        heavy = sorted({name.split(".")[0] for _, name in timings} & HEAVY_MODULES)
+        if heavy:
+            raise CommandError(f"При старте импортируются тяжёлые зависимости: {', '.join(heavy)}")
+        if total_ms > options["budget_ms"]:
+            raise CommandError(f"Импорт занимает {total_ms:.0f} мс, бюджет {options['budget_ms']:.0f} мс")
+        self.stdout.write(self.style.SUCCESS("Тяжёлые зависимости при старте не загружаются"))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcriber', '0005_taskfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskfile',
+            name='meta',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Метаданные'),
+        ),
+    ]
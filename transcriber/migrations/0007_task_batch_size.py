@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcriber', '0006_taskfile_meta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='batch_size',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Сколько сегментов файла декодировать за один проход. Пусто — из настроек, 0 или 1 — по одному', null=True, verbose_name='Размер батча'),
+        ),
+    ]
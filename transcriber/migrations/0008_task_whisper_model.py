@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcriber', '0007_task_batch_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='whisper_model',
+            field=models.CharField(blank=True, help_text='Ключ модели из настройки WHISPER_MODELS. Пусто — модель по умолчанию', max_length=64, verbose_name='Модель Whisper'),
+        ),
+    ]
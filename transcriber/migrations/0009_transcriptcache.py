@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcriber', '0008_task_whisper_model'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranscriptCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Ключ')),
+                ('audio_sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256 аудио')),
+                ('params', models.JSONField(verbose_name='Параметры распознавания')),
+                ('result_text', models.TextField(blank=True, verbose_name='Результат транскрипции')),
+                ('meta', models.JSONField(blank=True, default=dict, verbose_name='Метаданные')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Последнее использование')),
+            ],
+            options={
+                'verbose_name': 'Кэш транскрипции',
+                'verbose_name_plural': 'Кэш транскрипций',
+            },
+        ),
+    ]
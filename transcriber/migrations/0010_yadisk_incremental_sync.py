@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:06
+
+import django.db.models.deletion
+import filer.fields.file
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('filer', '0018_alter_file_options'),
+        ('transcriber', '0009_transcriptcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='sync_mode',
+            field=models.CharField(choices=[('FULL', 'Полная (скачивать всё заново)'), ('INCREMENTAL', 'Инкрементальная (только новые и изменённые)')], default='INCREMENTAL', help_text='Как повторно синхронизировать папку Яндекс.Диска', max_length=20, verbose_name='Режим синхронизации'),
+        ),
+        migrations.CreateModel(
+            name='YaDiskFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=1024, verbose_name='Путь на Яндекс.Диске')),
+                ('md5', models.CharField(blank=True, max_length=32, verbose_name='MD5')),
+                ('size', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Размер')),
+                ('modified', models.DateTimeField(blank=True, null=True, verbose_name='Дата изменения на диске')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('filer_file', filer.fields.file.FilerFileField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='filer.file', verbose_name='Файл в Filer')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='yadisk_files', to='transcriber.task', verbose_name='Задача')),
+            ],
+            options={
+                'verbose_name': 'Файл Яндекс.Диска',
+                'verbose_name_plural': 'Файлы Яндекс.Диска',
+                'constraints': [models.UniqueConstraint(fields=('task', 'path'), name='unique_yadisk_file_path')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:08
+
+from django.db import migrations, models
+
+
+def remove_duplicate_task_files(apps, schema_editor):
+    """Оставляет по одному TaskFile (самому раннему) на пару (task, filer_file)."""
+    TaskFile = apps.get_model('transcriber', 'TaskFile')
+    seen = set()
+    duplicates = []
+    for pk, task_id, filer_file_id in (
+        TaskFile.objects
+        .filter(filer_file__isnull=False)
+        .order_by('task_id', 'filer_file_id', 'created_at')
+        .values_list('pk', 'task_id', 'filer_file_id')
+        .iterator()
+    ):
+        if (task_id, filer_file_id) in seen:
+            duplicates.append(pk)
+        else:
+            seen.add((task_id, filer_file_id))
+    TaskFile.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcriber', '0010_yadisk_incremental_sync'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_task_files, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='taskfile',
+            constraint=models.UniqueConstraint(fields=('task', 'filer_file'), name='unique_task_filer_file'),
+        ),
+    ]
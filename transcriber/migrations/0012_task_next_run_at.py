@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:09
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+INTERVALS = {
+    'MINUTES': 'minutes',
+    'HOURS': 'hours',
+    'DAYS': 'days',
+}
+
+
+def fill_next_run_at(apps, schema_editor):
+    """То же, что Task.compute_next_run_at, для уже существующих задач."""
+    Task = apps.get_model('transcriber', 'Task')
+    for task in Task.objects.all().iterator():
+        if task.task_type == 'ONE_TIME':
+            next_run_at = task.run_once_at if task.last_run is None else None
+        elif not task.last_run or not task.interval:
+            next_run_at = task.run_once_at
+        else:
+            unit = INTERVALS.get(task.interval_type)
+            delta = timedelta(**{unit: task.interval}) if unit else timedelta(days=1)
+            next_run_at = task.last_run + delta
+        Task.objects.filter(pk=task.pk).update(next_run_at=next_run_at)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcriber', '0011_taskfile_unique_filer_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='next_run_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, help_text='Пересчитывается при сохранении. Пусто — задача больше не запускается', null=True, verbose_name='Следующий запуск'),
+        ),
+        migrations.RunPython(fill_next_run_at, migrations.RunPython.noop),
+    ]
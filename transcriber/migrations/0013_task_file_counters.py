@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:10
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_file_counters(apps, schema_editor):
+    """Иначе задачи, которые уже в обработке, завершились бы при первом проходе с нулевым счётчиком."""
+    Task = apps.get_model('transcriber', 'Task')
+    tasks = Task.objects.annotate(
+        pending=Count('files', filter=~Q(files__status__in=['DONE', 'ERROR'])),
+        failed=Count('files', filter=Q(files__status='ERROR')),
+    )
+    for task in tasks.iterator():
+        Task.objects.filter(pk=task.pk).update(pending_files=task.pending, failed_files=task.failed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcriber', '0012_task_next_run_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='failed_files',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Файлов с ошибкой'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='pending_files',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Файлов в работе'),
+        ),
+        migrations.RunPython(fill_file_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcriber', '0013_task_file_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcriptcache',
+            name='segments',
+            field=models.JSONField(blank=True, default=list, verbose_name='Фрагменты [начало, конец, текст]'),
+        ),
+        migrations.CreateModel(
+            name='TranscriptSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.FloatField(verbose_name='Начало, с')),
+                ('end', models.FloatField(verbose_name='Конец, с')),
+                ('text', models.TextField(verbose_name='Текст')),
+                ('task_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='transcriber.taskfile', verbose_name='Файл задачи')),
+            ],
+            options={
+                'verbose_name': 'Фрагмент транскрипции',
+                'verbose_name_plural': 'Фрагменты транскрипции',
+            },
+        ),
+    ]
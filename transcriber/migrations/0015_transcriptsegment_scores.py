@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcriber', '0014_transcript_segments'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='transcriptsegment',
+            options={'ordering': ['task_file', 'start'], 'verbose_name': 'Фрагмент транскрипции', 'verbose_name_plural': 'Фрагменты транскрипции'},
+        ),
+        migrations.AddField(
+            model_name='transcriptsegment',
+            name='avg_logprob',
+            field=models.FloatField(blank=True, null=True, verbose_name='Средний log-prob'),
+        ),
+        migrations.AddField(
+            model_name='transcriptsegment',
+            name='no_speech_prob',
+            field=models.FloatField(blank=True, null=True, verbose_name='Вероятность отсутствия речи'),
+        ),
+        migrations.AlterField(
+            model_name='transcriptcache',
+            name='segments',
+            field=models.JSONField(blank=True, default=list, verbose_name='Фрагменты транскрипции'),
+        ),
+        migrations.AddIndex(
+            model_name='transcriptsegment',
+            index=models.Index(fields=['task_file', 'start'], name='segment_task_file_start_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:13
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def fill_search_vector(apps, schema_editor):
+    """Индексируем уже готовые транскрипции."""
+    TaskFile = apps.get_model('transcriber', 'TaskFile')
+    TaskFile.objects.filter(status='DONE').update(
+        search_vector=SearchVector('result_text', config=settings.TRANSCRIPT_SEARCH_CONFIG)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcriber', '0015_transcriptsegment_scores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskfile',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='taskfile',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='taskfile_search_vector_gin'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcriber', '0016_taskfile_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskFileCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField(verbose_name='Номер чанка')),
+                ('params_key', models.CharField(max_length=64, verbose_name='Ключ параметров транскрипции')),
+                ('start', models.FloatField(verbose_name='Начало, с')),
+                ('end', models.FloatField(verbose_name='Конец, с')),
+                ('text', models.TextField(blank=True, verbose_name='Текст')),
+                ('segments', models.JSONField(blank=True, default=list, verbose_name='Фрагменты транскрипции')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('task_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='transcriber.taskfile', verbose_name='Файл задачи')),
+            ],
+            options={
+                'verbose_name': 'Контрольная точка файла',
+                'verbose_name_plural': 'Контрольные точки файлов',
+                'ordering': ['task_file', 'index'],
+                'constraints': [models.UniqueConstraint(fields=('task_file', 'index'), name='unique_task_file_checkpoint')],
+            },
+        ),
+    ]
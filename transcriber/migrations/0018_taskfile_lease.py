@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcriber', '0017_taskfilecheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskfile',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Попыток обработки'),
+        ),
+        migrations.AddField(
+            model_name='taskfile',
+            name='available_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Повтор не раньше'),
+        ),
+        migrations.AddField(
+            model_name='taskfile',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='Аренда до'),
+        ),
+        migrations.AddField(
+            model_name='taskfile',
+            name='lease_token',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:16
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcriber', '0018_taskfile_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='priority',
+            field=models.PositiveSmallIntegerField(default=0, help_text='0–9: файлы задач с большим приоритетом транскрибируются раньше', validators=[django.core.validators.MaxValueValidator(9)], verbose_name='Приоритет'),
+        ),
+        migrations.AddField(
+            model_name='taskfile',
+            name='duration',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Длительность, с'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcriber', '0019_duration_priority'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='decoding_profile',
+            field=models.CharField(blank=True, help_text='Ключ профиля из WHISPER_DECODING_PROFILES (fast, balanced, accurate). Пусто — профиль по умолчанию', max_length=32, verbose_name='Профиль декодирования'),
+        ),
+        migrations.AddField(
+            model_name='taskfile',
+            name='decoding_profile',
+            field=models.CharField(blank=True, editable=False, max_length=32, verbose_name='Профиль декодирования'),
+        ),
+    ]
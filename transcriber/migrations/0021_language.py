@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcriber', '0020_decoding_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='language',
+            field=models.CharField(default='ru', help_text='Код языка (ru, en, ...) или auto — определить по началу каждого файла', max_length=16, verbose_name='Язык'),
+        ),
+        migrations.AddField(
+            model_name='taskfile',
+            name='language',
+            field=models.CharField(blank=True, editable=False, max_length=16, verbose_name='Язык'),
+        ),
+        migrations.AddField(
+            model_name='taskfile',
+            name='language_probability',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Вероятность языка'),
+        ),
+    ]
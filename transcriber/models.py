@@ -1,6 +1,11 @@
+import re
 from datetime import timedelta
 
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector, SearchVectorField
 from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator
 from django.db import models
 from django.utils import timezone
 import uuid
@@ -23,6 +28,10 @@ class Task(models.Model):
         DONE = "DONE", "Обработан"
         ERROR = "ERROR", "Ошибка"
 
+    class SyncMode(models.TextChoices):
+        FULL = "FULL", "Полная (скачивать всё заново)"
+        INCREMENTAL = "INCREMENTAL", "Инкрементальная (только новые и изменённые)"
+
     class IntervalType(models.TextChoices):
         MINUTES = "MINUTES", "Минуты"
         HOURS = "HOURS", "Часы"
@@ -46,6 +55,10 @@ class Task(models.Model):
         help_text="Путь или ссылка на Яндекс.Диск, если выбран этот источник",
         verbose_name="Ссылка на Яндекс.Диск"
     )
+    sync_mode = models.CharField(
+        max_length=20, choices=SyncMode.choices, default=SyncMode.INCREMENTAL,
+        help_text="Как повторно синхронизировать папку Яндекс.Диска", verbose_name="Режим синхронизации"
+    )
     folder = FilerFolderField(
         verbose_name='Папка в Filer',
         on_delete=models.CASCADE,
@@ -75,7 +88,40 @@ class Task(models.Model):
         verbose_name="Статус"
     )
     last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    pending_files = models.IntegerField(default=0, editable=False, verbose_name="Файлов в работе")
+    failed_files = models.PositiveIntegerField(default=0, editable=False, verbose_name="Файлов с ошибкой")
     last_run = models.DateTimeField(null=True, blank=True, verbose_name="Последний запуск")
+    next_run_at = models.DateTimeField(
+        null=True, blank=True, db_index=True, editable=False,
+        help_text="Пересчитывается при сохранении. Пусто — задача больше не запускается",
+        verbose_name="Следующий запуск"
+    )
+
+    whisper_model = models.CharField(
+        max_length=64, blank=True,
+        help_text="Ключ модели из настройки WHISPER_MODELS. Пусто — модель по умолчанию",
+        verbose_name="Модель Whisper"
+    )
+    language = models.CharField(
+        max_length=16, default="ru",
+        help_text="Код языка (ru, en, ...) или auto — определить по началу каждого файла",
+        verbose_name="Язык"
+    )
+    decoding_profile = models.CharField(
+        max_length=32, blank=True,
+        help_text="Ключ профиля из WHISPER_DECODING_PROFILES (fast, balanced, accurate). Пусто — профиль по умолчанию",
+        verbose_name="Профиль декодирования"
+    )
+    batch_size = models.PositiveSmallIntegerField(
+        null=True, blank=True,
+        help_text="Сколько сегментов файла декодировать за один проход. Пусто — из настроек, 0 или 1 — по одному",
+        verbose_name="Размер батча"
+    )
+    priority = models.PositiveSmallIntegerField(
+        default=0, validators=[MaxValueValidator(9)],
+        help_text="0–9: файлы задач с большим приоритетом транскрибируются раньше",
+        verbose_name="Приоритет"
+    )
 
     archive_after_send = models.BooleanField(default=True, verbose_name="Архивировать после отправки")
     delete_after_send = models.BooleanField(default=True, verbose_name="Удалять после отправки")
@@ -85,9 +131,29 @@ class Task(models.Model):
         verbose_name = "Задача"
         verbose_name_plural = "Задачи"
 
+    # Поля, от которых зависит next_run_at
+    SCHEDULE_FIELDS = {"task_type", "run_once_at", "interval", "interval_type", "last_run"}
+    # значение language: определять язык по каждому файлу
+    AUTO_LANGUAGE = "auto"
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.next_run_at = self.compute_next_run_at()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and self.SCHEDULE_FIELDS & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "next_run_at"}
+        super().save(*args, **kwargs)
+
+    def compute_next_run_at(self):
+        """Когда задачу пора запускать: сохраняется в next_run_at, по нему ищутся готовые задачи."""
+        if self.task_type == self.TaskType.ONE_TIME:
+            return self.run_once_at if self.last_run is None else None
+        if not self.last_run:
+            return self.run_once_at
+        return self.next_run_time()
+
     def next_run_time(self):
         """Следующее время запуска задачи."""
         if not self.run_once_at:
@@ -145,6 +211,17 @@ class Task(models.Model):
             if not self.interval or self.interval <= 0:
                 raise ValidationError({"interval": "Для периодической задачи нужно указать интервал."})
 
+        if self.whisper_model and self.whisper_model not in settings.WHISPER_MODELS:
+            raise ValidationError({"whisper_model": f"Доступные модели: {', '.join(settings.WHISPER_MODELS)}."})
+
+        if self.language != self.AUTO_LANGUAGE and not re.fullmatch(r"[a-z]{2,3}", self.language or ""):
+            raise ValidationError({"language": f"Укажите код языка (ru, en, ...) или {self.AUTO_LANGUAGE}."})
+
+        if self.decoding_profile and self.decoding_profile not in settings.WHISPER_DECODING_PROFILES:
+            raise ValidationError({
+                "decoding_profile": f"Доступные профили: {', '.join(settings.WHISPER_DECODING_PROFILES)}."
+            })
+
 
 class TaskHistory(models.Model):
     task = models.ForeignKey(
@@ -176,6 +253,35 @@ class TaskLog(models.Model):
         return f"[{self.level}] {self.task.name} - {self.created_at}"
 
 
+class TaskFileQuerySet(models.QuerySet):
+    def search(self, query, search_type="websearch"):
+        """
+        Полнотекстовый поиск по транскрипциям (GIN-индекс по search_vector).
+        Результаты отсортированы по релевантности, у каждого есть rank и headline —
+        фрагмент текста с подсвеченными совпадениями.
+        """
+        search_query = SearchQuery(query, config=settings.TRANSCRIPT_SEARCH_CONFIG, search_type=search_type)
+        return (
+            self.filter(search_vector=search_query)
+            .annotate(
+                rank=SearchRank(models.F("search_vector"), search_query),
+                headline=SearchHeadline(
+                    "result_text",
+                    search_query,
+                    config=settings.TRANSCRIPT_SEARCH_CONFIG,
+                    start_sel="<b>",
+                    stop_sel="</b>",
+                    max_fragments=3,
+                ),
+            )
+            .order_by("-rank")
+        )
+
+    def update_search_vector(self):
+        """Пересчитывает поисковый вектор по result_text."""
+        return self.update(search_vector=SearchVector("result_text", config=settings.TRANSCRIPT_SEARCH_CONFIG))
+
+
 class TaskFile(models.Model):
     class Status(models.TextChoices):
         NEW = "NEW", "Новый"
@@ -198,13 +304,145 @@ class TaskFile(models.Model):
         max_length=20, choices=Status.choices, default=Status.NEW, verbose_name="Статус"
     )
     error = models.TextField(blank=True, verbose_name="Ошибка")
+    duration = models.FloatField(null=True, blank=True, editable=False, verbose_name="Длительность, с")
+    decoding_profile = models.CharField(max_length=32, blank=True, editable=False, verbose_name="Профиль декодирования")
+    language = models.CharField(max_length=16, blank=True, editable=False, verbose_name="Язык")
+    language_probability = models.FloatField(null=True, blank=True, editable=False, verbose_name="Вероятность языка")
+    meta = models.JSONField(default=dict, blank=True, verbose_name="Метаданные")
+    # аренда файла воркером: кто обрабатывает (lease_token) и до какого момента,
+    # если не продлит; истёкшие аренды подбирает reap_expired_leases
+    lease_token = models.UUIDField(null=True, blank=True, editable=False)
+    lease_expires_at = models.DateTimeField(null=True, blank=True, db_index=True, editable=False, verbose_name="Аренда до")
+    attempts = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name="Попыток обработки")
+    available_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Повтор не раньше")
+    # tsvector по result_text, заполняется при переводе файла в DONE
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TaskFileQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Файл задачи"
         verbose_name_plural = "Файлы задачи"
+        constraints = [
+            models.UniqueConstraint(fields=["task", "filer_file"], name="unique_task_filer_file"),
+        ]
+        indexes = [
+            GinIndex(fields=["search_vector"], name="taskfile_search_vector_gin"),
+        ]
 
     def __str__(self):
         return f"{self.task.name} — {self.filer_file.original_filename if self.filer_file else 'Без файла'}"
 
+
+
+class TranscriptSegmentQuerySet(models.QuerySet):
+    def between(self, start, end):
+        """Фрагменты, пересекающиеся с интервалом [start, end) в секундах от начала файла."""
+        return self.filter(start__lt=end, end__gt=start).order_by("start")
+
+
+class TranscriptSegment(models.Model):
+    """Фрагмент транскрипции с таймкодами от начала исходного файла и оценками уверенности Whisper."""
+    # порядок значений в компактном представлении фрагмента (кэш транскрипций)
+    FIELDS = ("start", "end", "text", "avg_logprob", "no_speech_prob")
+
+    task_file = models.ForeignKey(
+        TaskFile, on_delete=models.CASCADE, related_name="segments", verbose_name="Файл задачи"
+    )
+    start = models.FloatField(verbose_name="Начало, с")
+    end = models.FloatField(verbose_name="Конец, с")
+    text = models.TextField(verbose_name="Текст")
+    avg_logprob = models.FloatField(null=True, blank=True, verbose_name="Средний log-prob")
+    no_speech_prob = models.FloatField(null=True, blank=True, verbose_name="Вероятность отсутствия речи")
+
+    objects = TranscriptSegmentQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Фрагмент транскрипции"
+        verbose_name_plural = "Фрагменты транскрипции"
+        ordering = ["task_file", "start"]
+        indexes = [
+            models.Index(fields=["task_file", "start"], name="segment_task_file_start_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.start:.2f}–{self.end:.2f}: {self.text[:50]}"
+
+    @classmethod
+    def from_values(cls, task_file, values):
+        """Фрагмент из компактного списка значений в порядке FIELDS (недостающие — None)."""
+        return cls(task_file=task_file, **dict(zip(cls.FIELDS, values)))
+
+
+class TaskFileCheckpoint(models.Model):
+    """
+    Уже распознанный чанк файла. Если обработка прервалась (падение воркера, деплой),
+    следующий запуск продолжает файл с конца последнего сохранённого чанка.
+    """
+    task_file = models.ForeignKey(
+        TaskFile, on_delete=models.CASCADE, related_name="checkpoints", verbose_name="Файл задачи"
+    )
+    index = models.PositiveIntegerField(verbose_name="Номер чанка")
+    params_key = models.CharField(max_length=64, verbose_name="Ключ параметров транскрипции")
+    start = models.FloatField(verbose_name="Начало, с")
+    end = models.FloatField(verbose_name="Конец, с")
+    text = models.TextField(blank=True, verbose_name="Текст")
+    segments = models.JSONField(default=list, blank=True, verbose_name="Фрагменты транскрипции")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+
+    class Meta:
+        verbose_name = "Контрольная точка файла"
+        verbose_name_plural = "Контрольные точки файлов"
+        ordering = ["task_file", "index"]
+        constraints = [
+            models.UniqueConstraint(fields=["task_file", "index"], name="unique_task_file_checkpoint"),
+        ]
+
+    def __str__(self):
+        return f"{self.task_file_id} #{self.index} ({self.start:.0f}–{self.end:.0f} с)"
+
+
+class YaDiskFile(models.Model):
+    """Скачанный файл Яндекс.Диска: по md5/размеру/дате видно, изменился ли он на диске."""
+    task = models.ForeignKey(
+        Task, on_delete=models.CASCADE, related_name="yadisk_files", verbose_name="Задача"
+    )
+    path = models.CharField(max_length=1024, verbose_name="Путь на Яндекс.Диске")
+    md5 = models.CharField(max_length=32, blank=True, verbose_name="MD5")
+    size = models.PositiveBigIntegerField(null=True, blank=True, verbose_name="Размер")
+    modified = models.DateTimeField(null=True, blank=True, verbose_name="Дата изменения на диске")
+    filer_file = FilerFileField(
+        on_delete=models.CASCADE, related_name="+", verbose_name="Файл в Filer"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Файл Яндекс.Диска"
+        verbose_name_plural = "Файлы Яндекс.Диска"
+        constraints = [
+            models.UniqueConstraint(fields=["task", "path"], name="unique_yadisk_file_path"),
+        ]
+
+    def __str__(self):
+        return self.path
+
+
+class TranscriptCache(models.Model):
+    """Готовая транскрипция, адресуемая хэшем аудио и параметрами распознавания."""
+    key = models.CharField(max_length=64, unique=True, verbose_name="Ключ")
+    audio_sha256 = models.CharField(max_length=64, db_index=True, verbose_name="SHA-256 аудио")
+    params = models.JSONField(verbose_name="Параметры распознавания")
+    result_text = models.TextField(blank=True, verbose_name="Результат транскрипции")
+    segments = models.JSONField(default=list, blank=True, verbose_name="Фрагменты транскрипции")
+    meta = models.JSONField(default=dict, blank=True, verbose_name="Метаданные")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name="Последнее использование")
+
+    class Meta:
+        verbose_name = "Кэш транскрипции"
+        verbose_name_plural = "Кэш транскрипций"
+
+    def __str__(self):
+        return f"{self.audio_sha256[:12]} ({self.params.get('model', '-')})"
@@ -0,0 +1,121 @@
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
+
+from transcriber.audio import AudioChunk
+from transcriber.inference import create_whisper_model, detect_language, transcribe_chunks
+
+logger = logging.getLogger(__name__)
+
+# Пул процессов текущего воркера и параметры, с которыми он создан.
+# Пул переиспользуется между файлами, чтобы модели не загружались заново на каждый файл.
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+# Модель внутри процесса пула
+_process_model = None
+
+
+def _init_process(definition, cpu_threads):
+    global _process_model
+    _process_model = create_whisper_model(definition, cpu_threads=cpu_threads)
+
+
+def _transcribe_group(chunks, batch_size, options):
+    """Выполняется в процессе пула: сегменты для каждого чанка группы, по порядку."""
+    return [segments for _, segments in transcribe_chunks(_process_model, chunks, batch_size, **options)]
+
+
+def _detect_language(audio):
+    return detect_language(_process_model, audio)
+
+
+def can_fork_processes():
+    """Демонические процессы (дочерние процессы prefork-пула Celery) не могут создавать свои."""
+    return not multiprocessing.current_process().daemon
+
+
+def get_pool(definition, processes, cpu_budget):
+    """
+    Пул из processes процессов, в каждом своя модель с cpu_threads = cpu_budget // processes,
+    чтобы вместе они не занимали больше cpu_budget ядер.
+    """
+    global _pool, _pool_key
+    cpu_threads = max(1, cpu_budget // processes)
+    key = (repr(sorted(definition.items())), processes, cpu_threads)
+    with _pool_lock:
+        if _pool is not None and _pool_key == key:
+            return _pool
+        shutdown_pool()
+        logger.info(
+            f"[get_pool] Запускаем {processes} процессов транскрипции по {cpu_threads} потоков ({definition['model']})"
+        )
+        _pool = ProcessPoolExecutor(
+            max_workers=processes,
+            # spawn: в дочерний процесс не копируется состояние воркера (соединения с БД, потоки)
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_process,
+            initargs=(definition, cpu_threads),
+        )
+        _pool_key = key
+        return _pool
+
+
+def shutdown_pool():
+    global _pool, _pool_key
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = _pool_key = None
+
+
+def detect_language_parallel(definition, processes, cpu_budget, audio):
+    """Определение языка моделью из пула: в самом воркере модель для этого не загружается."""
+    return get_pool(definition, processes, cpu_budget).submit(_detect_language, audio).result()
+
+
+def transcribe_chunks_parallel(
+    definition: dict,
+    chunks: Iterable[AudioChunk],
+    processes: int,
+    cpu_budget: int,
+    batch_size: int = 0,
+    **options,
+) -> Iterator[Tuple[AudioChunk, List]]:
+    """
+    То же, что inference.transcribe_chunks, но чанки одного файла распознаются параллельно
+    в пуле процессов. Чанки отправляются группами по batch_size (или по одному), в работе
+    держится не больше двух групп на процесс, результаты отдаются строго в порядке чанков.
+    """
+    pool = get_pool(definition, processes, cpu_budget)
+    group_size = max(1, batch_size)
+    chunks = iter(chunks)
+    in_flight = deque()
+
+    def submit():
+        group = list(islice(chunks, group_size))
+        if group:
+            in_flight.append((group, pool.submit(_transcribe_group, group, batch_size, options)))
+        return bool(group)
+
+    try:
+        while len(in_flight) < processes * 2 and submit():
+            pass
+        while in_flight:
+            group, future = in_flight.popleft()
+            results = future.result()
+            submit()
+            yield from zip(group, results)
+    except BrokenProcessPool:
+        # процесс пула упал (например, по памяти) — следующий файл создаст пул заново
+        with _pool_lock:
+            shutdown_pool()
+        raise
+    finally:
+        for _, future in in_flight:
+            future.cancel()
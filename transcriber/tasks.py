@@ -1,35 +1,37 @@
-import io
 import logging
-import os
-import subprocess
+import threading
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from contextlib import contextmanager
 from datetime import timedelta
-import os
-import tempfile
-from typing import List
+from itertools import chain as chain_iterables
 
-from pydub import AudioSegment
-from celery import shared_task
-import logging
-
-
-import yadisk
+from celery import chain, shared_task
+from django.conf import settings
 from django.core.cache import cache
-from django.db.models.query_utils import Q
+from django.db.models import Count, F, Q
 from django.utils import timezone
-from django.core.files.base import ContentFile
-from django.core.files import File as DjangoFile
-from django.db import transaction
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import connection, transaction
 
 from django_whisper_pipeline import celery_app
 from django_whisper_pipeline.logging_handlers import get_task_logger
 from django_whisper_pipeline.settings import YA_DISK_TOKEN
-from transcriber.models import Task, TaskFile
+from transcriber.audio import iter_audio_chunks, iter_speech_chunks, probe_duration
+from transcriber.inference import (
+    detect_language, get_decoding_profile, get_model_definition, get_whisper_model, transcribe_chunks,
+)
+from transcriber.parallel import can_fork_processes, detect_language_parallel, transcribe_chunks_parallel
+from transcriber.models import Task, TaskFile, TaskFileCheckpoint, TranscriptSegment, YaDiskFile
+from transcriber.transcript_cache import (
+    evict_transcript_cache, file_sha256, get_cached_transcript, store_transcript, transcript_cache_key,
+)
 from filer.models import Folder, File
-from faster_whisper import WhisperModel
 
 logger = logging.getLogger(__name__)
-MODEL = None
+FILL_BATCH_SIZE = 1000
+WHISPER_WINDOW_SEC = 30
 
 @contextmanager
 def single_task_lock(lock_name: str, timeout: int = 300):
@@ -50,14 +52,35 @@ def single_task_lock(lock_name: str, timeout: int = 300):
             lock.release()
 
 
-def get_whisper_model():
-    global MODEL
-    if MODEL is None:
-        logger.info("[get_whisper_model] Загружаем модель Whisper впервые...")
-        # MODEL = WhisperModel("/app/models", device="cpu", compute_type="int8")  # или "small", если хочешь быстрее
-        MODEL = WhisperModel("tiny", device="cpu", compute_type="int8")
-        logger.info("[get_whisper_model] Модель Whisper успешно загружена")
-    return MODEL
+def _remote_file_changed(record, item):
+    """Изменился ли файл на Я.Диске с момента скачивания (по md5, а без него — по размеру и дате)."""
+    if record.md5 and item["md5"]:
+        return record.md5 != item["md5"]
+    return record.size != item["size"] or record.modified != item["modified"]
+
+
+def _download_yadisk_file(ya, item, logger):
+    """
+    Скачивает файл Я.Диска потоком во временный файл в FILE_UPLOAD_TEMP_DIR.
+    Хранилище Filer потом переносит его на место (rename), а не копирует через память.
+    Оборванная загрузка повторяется до YA_DISK_DOWNLOAD_RETRIES раз.
+    """
+    logger.info(f"[download_from_yadisk_task] Скачиваем файл: {item['name']}")
+    upload = TemporaryUploadedFile(item["name"], item["mime_type"] or "application/octet-stream", item["size"], None)
+    try:
+        ya.download(
+            item["path"],
+            upload.file,
+            n_retries=settings.YA_DISK_DOWNLOAD_RETRIES,
+            retry_interval=settings.YA_DISK_DOWNLOAD_RETRY_INTERVAL,
+        )
+        upload.size = upload.file.tell()
+        upload.seek(0)
+    except Exception:
+        upload.close()
+        raise
+    return upload
+
 
 def download_from_yadisk_task(task_id):
     logger = get_task_logger(task_id)
@@ -66,6 +89,8 @@ def download_from_yadisk_task(task_id):
     logger.debug(f"[download_from_yadisk_task] Статус задачи {task_id} изменён на PROCESSING_FILLED_FILES")
 
     try:
+        import yadisk
+
         ya = yadisk.YaDisk(token=YA_DISK_TOKEN)
         folder_url = task.ya_disk_path.strip()
         logger.info(f"[download_from_yadisk_task] Проверяем доступность ссылки: {folder_url}")
@@ -85,30 +110,80 @@ def download_from_yadisk_task(task_id):
             logger.debug(f"[download_from_yadisk_task] Используем существующую папку Filer: {filer_folder.name}")
 
         # перебираем файлы на Я.Диске
-        logger.info(f"[download_from_yadisk_task] Начинаем загрузку файлов из {folder_url}")
+        remote_files = []
         for item in ya.listdir(folder_url):
             if item["type"] != "file":
                 logger.debug(f"[download_from_yadisk_task] Пропускаем элемент (не файл): {item['name']}")
                 continue
+            remote_files.append(item)
 
-            filename = item["name"]
-            file_path = item["path"]
-            logger.info(f"[download_from_yadisk_task] Скачиваем файл: {filename}")
+        # сверяем с тем, что уже скачано: при инкрементальной синхронизации
+        # качаем только новые и изменённые файлы
+        incremental = task.sync_mode == Task.SyncMode.INCREMENTAL
+        known = {f.path: f for f in task.yadisk_files.select_related("filer_file")}
+        to_download = []
+        unchanged = changed = 0
+        for item in remote_files:
+            record = known.pop(item["path"], None)
+            if record is not None:
+                if incremental and not _remote_file_changed(record, item):
+                    unchanged += 1
+                    continue
+                # удаляется и TaskFile со старым результатом, и запись YaDiskFile
+                record.filer_file.delete()
+                changed += 1
+            to_download.append(item)
 
-            file_like = io.BytesIO()
-            ya.download(file_path, file_like)
+        for path, record in known.items():
+            logger.info(f"[download_from_yadisk_task] Файл удалён на диске, удаляем локально: {path}")
+            record.filer_file.delete()
 
-            file_like.seek(0)
-            content = ContentFile(file_like.read(), name=filename)
-            DjangoFile_obj = DjangoFile(content, name=filename)
+        # файлы папки без записи YaDiskFile (скачаны до инкрементальной синхронизации
+        # или загрузка оборвалась до записи) сверить не с чем: удаляем их вместе
+        # с TaskFile, с диска они скачаются заново
+        stale = File.objects.filter(folder=filer_folder).exclude(
+            id__in=YaDiskFile.objects.filter(task=task).values("filer_file_id")
+        )
+        stale_count = 0
+        for file in stale:
+            logger.info(f"[download_from_yadisk_task] Файл без записи о синхронизации, удаляем: {file.original_filename}")
+            file.delete()
+            stale_count += 1
 
-            File.objects.create(
-                original_filename=filename,
-                file=DjangoFile_obj,
-                folder=filer_folder,
-                owner=None,
-            )
-            logger.debug(f"[download_from_yadisk_task] Файл {filename} сохранён в Filer")
+        logger.info(
+            f"[download_from_yadisk_task] К загрузке {len(to_download)} файлов из {folder_url}: "
+            f"новых {len(to_download) - changed}, изменённых {changed}, без изменений {unchanged}, "
+            f"удалено {len(known)}, без записи о синхронизации {stale_count}"
+        )
+        with ThreadPoolExecutor(max_workers=settings.YA_DISK_DOWNLOAD_WORKERS) as pool:
+            futures = {pool.submit(_download_yadisk_file, ya, item, logger): item for item in to_download}
+            try:
+                # в БД пишем из этого потока по мере готовности файлов
+                for future in as_completed(futures):
+                    item = futures[future]
+                    upload = future.result()
+                    try:
+                        filer_file = File.objects.create(
+                            original_filename=item["name"],
+                            file=upload,
+                            folder=filer_folder,
+                            owner=None,
+                        )
+                    finally:
+                        upload.close()
+                    YaDiskFile.objects.create(
+                        task=task,
+                        path=item["path"],
+                        md5=item["md5"] or "",
+                        size=item["size"],
+                        modified=item["modified"],
+                        filer_file=filer_file,
+                    )
+                    logger.debug(f"[download_from_yadisk_task] Файл {item['name']} сохранён в Filer")
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
 
         task.last_error = ""
         logger.info(f"[download_from_yadisk_task] Все файлы успешно загружены для задачи {task_id}")
@@ -123,146 +198,1062 @@ def download_from_yadisk_task(task_id):
         logger.info("[download_from_yadisk_task] Завершено.")
 
 
-def fill_task_files(task_id):
-    task = Task.objects.get(id=task_id)
-    for f in File.objects.filter(folder=task.folder):
-        TaskFile.objects.get_or_create(
-            task=task,
-            filer_file=f,
-            defaults={"status": TaskFile.Status.NEW}
+def probe_missing_files(task):
+    """
+    Длительности файлов папки задачи, у которых ещё нет TaskFile: {id файла: секунды}.
+    Вызывается до транзакции заполнения: ffprobe по тысячам файлов не должен держать её открытой.
+    """
+    if not task.folder:
+        return {}
+
+    missing_files = (
+        File.objects
+        .filter(folder=task.folder)
+        .exclude(id__in=TaskFile.objects.filter(task=task, filer_file__isnull=False).values("filer_file_id"))
+        .only("id", "file")
+    )
+    return probe_file_durations({file.id: file.file.path for file in missing_files.iterator()})
+
+
+def fill_task_files(task, durations):
+    """
+    Создаёт TaskFile для файлов, измеренных probe_missing_files.
+    Файлы вставляются пачками по FILL_BATCH_SIZE; гонку с параллельным заполнением
+    гасит уникальный индекс (task, filer_file) и ignore_conflicts.
+    """
+    # файл могли удалить, пока шёл ffprobe
+    existing = set(
+        File.objects.filter(id__in=list(durations), folder=task.folder).values_list("id", flat=True)
+    ) if durations else set()
+    new_files = [
+        TaskFile(task=task, filer_file_id=file_id, status=TaskFile.Status.NEW, duration=duration)
+        for file_id, duration in durations.items()
+        if file_id in existing
+    ]
+    TaskFile.objects.bulk_create(new_files, batch_size=FILL_BATCH_SIZE, ignore_conflicts=True)
+    logger.info(f"[fill_task_files] Для задачи {task.id} добавлено файлов: {len(new_files)}")
+    dispatch_task_files(new_files, task.priority)
+
+
+def retry_failed_task_files(task):
+    """
+    Возвращает в очередь файлы, оставшиеся в ERROR с прошлого запуска (при инкрементальной
+    синхронизации их не удаляют). Иначе они не повторялись бы никогда, а в failed_files
+    и last_error попадали бы на каждом запуске.
+    """
+    failed = list(task.files.filter(status=TaskFile.Status.ERROR).only("id", "duration"))
+    if not failed:
+        return
+    TaskFile.objects.filter(id__in=[f.id for f in failed], status=TaskFile.Status.ERROR).update(
+        status=TaskFile.Status.NEW,
+        error="",
+        attempts=0,
+        available_at=None,
+        lease_token=None,
+        lease_expires_at=None,
+        updated_at=timezone.now(),
+    )
+    logger.info(f"[retry_failed_task_files] Для задачи {task.id} повторно поставлено файлов с ошибкой: {len(failed)}")
+    dispatch_task_files(failed, task.priority)
+
+
+def probe_file_durations(paths):
+    """
+    Длительности файлов {ключ: путь} -> {ключ: секунды}, ffprobe в TRANSCRIBE_PROBE_WORKERS потоков.
+    Если файл не удалось прочитать, длительность None: он пойдёт в очередь длинных.
+    """
+    def probe(path):
+        try:
+            return probe_duration(path)
+        except Exception as e:
+            logger.warning(f"[probe_file_durations] Не удалось определить длительность {path}: {e}")
+            return None
+
+    if not paths:
+        return {}
+    with ThreadPoolExecutor(max_workers=settings.TRANSCRIBE_PROBE_WORKERS) as executor:
+        return dict(zip(paths.keys(), executor.map(probe, paths.values())))
+
+
+def is_microbatch_clip(duration):
+    return (
+        settings.TRANSCRIBE_MICROBATCH_SIZE > 1
+        and duration is not None
+        and duration <= settings.TRANSCRIBE_MICROBATCH_MAX_SEC
+    )
+
+
+def transcribe_queue(duration):
+    if duration is not None and duration <= settings.TRANSCRIBE_SHORT_MAX_SEC:
+        return "transcribe_short"
+    return "transcribe_long"
+
+
+def enqueue_task_file(task_file_id, duration, priority=0, countdown=None):
+    """Ставит транскрипцию файла в очередь по его длительности с приоритетом задачи."""
+    process_task_file.apply_async(
+        (str(task_file_id),),
+        queue=transcribe_queue(duration),
+        priority=9 - priority,  # в Redis 0 — самый высокий приоритет
+        countdown=countdown,
+    )
+
+
+def dispatch_task_files(task_files, priority=0):
+    """
+    Ставит транскрипцию каждого файла в очередь сразу после коммита транзакции,
+    в которой файлы созданы (до коммита воркер их ещё не увидит).
+    Короткие файлы отправляются первыми: в своей очереди они идут по возрастанию длительности.
+    """
+    if not task_files:
+        return
+
+    def _dispatch():
+        ordered = sorted(task_files, key=lambda f: (f.duration is None, f.duration or 0))
+        clips = [f for f in ordered if is_microbatch_clip(f.duration)]
+        # короткие клипы — одним заданием на TRANSCRIBE_MICROBATCH_SIZE файлов; какие именно
+        # файлы попадут в батч, решает claim_short_task_files в момент выполнения
+        for _ in range(0, len(clips), settings.TRANSCRIBE_MICROBATCH_SIZE):
+            process_short_batch.apply_async(queue="transcribe_short", priority=9 - priority)
+        for task_file in ordered:
+            if not is_microbatch_clip(task_file.duration):
+                enqueue_task_file(task_file.id, task_file.duration, priority)
+        logger.info(
+            f"[dispatch_task_files] Поставлено в очередь файлов: {len(task_files)}, из них в микробатчах: {len(clips)}"
         )
 
+    transaction.on_commit(_dispatch)
+
+
+# Задачи, которые можно запускать по расписанию: новые и завершённые периодические
+RUNNABLE_TASKS = Q(status=Task.Status.NEW) | Q(task_type=Task.TaskType.PERIODIC, status=Task.Status.DONE)
+
+
+def claim_task(task_id, force=False):
+    """
+    Атомарно переводит задачу в PROCESSING_FILLED_FILES, если её пора запускать.
+    force — ручной запуск: подходит любая задача, которая сейчас не в обработке.
+    Если одновременно сработали запуск по eta и проход run_ready_tasks, задачу получит только один.
+    """
+    if force:
+        runnable = Task.objects.exclude(
+            status__in=[Task.Status.PROCESSING, Task.Status.PROCESSING_FILLED_FILES]
+        )
+    else:
+        runnable = Task.objects.filter(RUNNABLE_TASKS, next_run_at__lte=timezone.now())
+    # updated_at ставим явно: по нему reap_expired_leases находит зависшую подготовку
+    return runnable.filter(id=task_id).update(
+        status=Task.Status.PROCESSING_FILLED_FILES, updated_at=timezone.now()
+    ) == 1
+
+
+def fail_task(task_id, error):
+    Task.objects.filter(id=task_id).update(status=Task.Status.ERROR, last_error=str(error))
+
+
+def _get_starting_task(task_id):
+    """Задача на стадиях подготовки или None, если её успели перевести в ошибку."""
+    return Task.objects.filter(id=task_id, status=Task.Status.PROCESSING_FILLED_FILES).first()
+
+
+@celery_app.task
+def cleanup_task_stage(task_id):
+    """Стадия 1: удаляет файлы и результаты прошлого запуска."""
+    task = _get_starting_task(task_id)
+    if task is None:
+        return
+
+    # при инкрементальной синхронизации результаты по неизменившимся
+    # файлам сохраняются, лишнее удалит download_from_yadisk_task
+    if task.source_type == task.SourceType.YADISK and task.sync_mode == task.SyncMode.INCREMENTAL:
+        return
+
+    try:
+        with transaction.atomic():
+            for task_file in task.files.select_related("filer_file"):
+                if task_file.filer_file:
+                    # каскадом удаляется и сам TaskFile
+                    task_file.filer_file.delete()
+                else:
+                    task_file.delete()
+            if task.source_type == task.SourceType.YADISK:
+                for file in File.objects.filter(folder=task.folder):
+                    file.delete()
+    except Exception as e:
+        logger.exception(f"[cleanup_task_stage] Ошибка при очистке задачи {task_id}: {e}")
+        fail_task(task_id, e)
+
+
+@celery_app.task
+def fetch_task_stage(task_id):
+    """Стадия 2: скачивает файлы источника. Для разных задач идёт параллельно на разных воркерах."""
+    task = _get_starting_task(task_id)
+    if task is None or task.source_type != task.SourceType.YADISK:
+        return
+    # при ошибке сама переводит задачу в ERROR
+    download_from_yadisk_task(task_id)
+
+
+@celery_app.task
+def fill_task_stage(task_id):
+    """Стадия 3: создаёт TaskFile, переводит задачу в PROCESSING и ставит файлы на транскрипцию."""
+    task = _get_starting_task(task_id)
+    if task is None:
+        return
+
+    try:
+        durations = probe_missing_files(task)
+        with transaction.atomic():
+            retry_failed_task_files(task)
+            fill_task_files(task, durations)
+            # счётчики пересчитываются целиком: часть файлов могла остаться с прошлого запуска
+            counts = task.files.aggregate(
+                pending=Count("id", filter=~Q(status__in=[TaskFile.Status.DONE, TaskFile.Status.ERROR])),
+                failed=Count("id", filter=Q(status=TaskFile.Status.ERROR)),
+            )
+            Task.objects.filter(id=task_id).update(
+                status=Task.Status.PROCESSING,
+                pending_files=counts["pending"],
+                failed_files=counts["failed"],
+            )
+    except Exception as e:
+        logger.exception(f"[fill_task_stage] Ошибка при заполнении файлов задачи {task_id}: {e}")
+        fail_task(task_id, e)
+        return
+
+    # в папке могло не оказаться файлов
+    finalize_task(task_id)
+
+
+def finalize_task(task_id):
+    """Стадия завершения: задача становится DONE, как только счётчик незавершённых файлов дошёл до нуля."""
+    with transaction.atomic():
+        task = (
+            Task.objects
+            .select_for_update()
+            .filter(id=task_id, status=Task.Status.PROCESSING, pending_files__lte=0)
+            .first()
+        )
+        if task is None:
+            return
+        task.status = Task.Status.DONE
+        task.last_run = timezone.now()
+        task.last_error = f"Не удалось обработать файлов: {task.failed_files}" if task.failed_files else ""
+        task.save(update_fields=["status", "last_run", "last_error"])
+        schedule_task_run(task)
+
+
+def run_task(task_id):
+    """
+    Запускает подготовку захваченной задачи (см. claim_task): очистка, загрузка и заполнение
+    файлов идут цепочкой отдельных celery-задач, каждая коммитит свою работу сама.
+    Транскрипция файлов и завершение задачи запускаются дальше по событиям.
+    """
+    task_id = str(task_id)
+    chain(
+        cleanup_task_stage.si(task_id),
+        fetch_task_stage.si(task_id),
+        fill_task_stage.si(task_id),
+    ).apply_async()
+
+
+@celery_app.task
+def start_task(task_id, force=False):
+    """Запуск одной задачи: по eta (schedule_task_run) или вручную из админки."""
+    if not claim_task(task_id, force=force):
+        logger.info(f"[start_task] Задача {task_id} уже в обработке или её время ещё не пришло")
+        return
+    run_task(task_id)
+
+
+def schedule_task_run(task):
+    """
+    Ставит start_task в очередь с eta=next_run_at, если до запуска меньше TASK_ETA_HORIZON_SEC.
+    Дальние запуски сразу не ставятся (Redis переотправляет сообщения с долгим eta
+    по visibility_timeout) — их поставит один из следующих проходов run_ready_tasks.
+    """
+    if task.next_run_at is None:
+        return
+    if task.next_run_at - timezone.now() > timedelta(seconds=settings.TASK_ETA_HORIZON_SEC):
+        return
+
+    # проход run_ready_tasks повторяется — один и тот же запуск ставим только раз
+    key = f"start_task:{task.id}:{task.next_run_at.timestamp()}"
+    if not cache.add(key, 1, timeout=settings.TASK_ETA_HORIZON_SEC * 2):
+        return
+
+    task_id, eta = str(task.id), task.next_run_at
+    transaction.on_commit(lambda: start_task.apply_async(args=[task_id], eta=eta))
+
 
 @celery_app.task
 def run_ready_tasks():
+    """
+    Страховочный проход по расписанию: запускает задачи, чей next_run_at уже наступил,
+    ставит с eta ближайшие запуски и завершает задачи, все файлы которых обработаны.
+    """
     lock_name = "run_ready_tasks_global_lock"
 
-    with single_task_lock(lock_name, timeout=1200) as acquired:
+    with single_task_lock(lock_name, timeout=120) as acquired:
         if not acquired:
             logger.info("[run_ready_tasks] Пропуск — другая задача уже выполняется")
             return
 
         logger.info("[run_ready_tasks] Проверяем готовые задачи")
         now = timezone.now()
-        ready_tasks = Task.objects.filter(
-            Q(status=Task.Status.NEW) |
-            Q(Q(task_type=Task.TaskType.PERIODIC) & Q(status=Task.Status.DONE))
+        due_task_ids = list(
+            Task.objects.filter(RUNNABLE_TASKS, next_run_at__lte=now).values_list("id", flat=True)
         )
-        logger.debug(f"[run_ready_tasks] Найдено задач для проверки: {ready_tasks.count()}")
-
-        for task in ready_tasks:
-            if task.is_ready_to_run(now):
-                with transaction.atomic():
-                    task.status = Task.Status.PROCESSING
-                    for file in task.files.all():
-                        file.filer_file.delete(save=False)
-                        file.delete()
-                    if task.source_type == task.SourceType.YADISK:
-                        for file in File.objects.filter(folder=task.folder):
-                            file.file.delete(save=False)
-                            file.delete()
-                        download_from_yadisk_task(task.id)
-                    fill_task_files(task.id)
-
-                    task.save(update_fields=["status"])
-
-        processed_tasks = Task.objects.filter(status=Task.Status.PROCESSING)
-        for task in processed_tasks:
-            if not task.files.exclude(status=Task.Status.DONE).exists():
-                task.status = Task.Status.DONE
-                task.last_run = timezone.now()
-                task.save(update_fields=["status", "last_run"])
-
-
-def split_audio_ffmpeg(file_path: str, chunk_length_sec: int = 30) -> List[str]:
-    """
-    Разбивает аудио на чанки фиксированной длины через ffmpeg.
-    Возвращает список временных файлов.
-    """
-    # Получаем длительность файла
-    result = subprocess.run(
-        ["ffprobe", "-v", "error", "-show_entries", "format=duration",
-         "-of", "default=noprint_wrappers=1:nokey=1", file_path],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-    duration = float(result.stdout.strip())
-
-    chunks = []
-    for i in range(0, int(duration), chunk_length_sec):
-        tmp_fd, tmp_path = tempfile.mkstemp(suffix=".wav")
-        os.close(tmp_fd)
-        # ffmpeg: добавляем -y, чтобы перезаписывать файлы без запроса
-        subprocess.run([
-            "ffmpeg",
-            "-y",  # <-- вот это важно
-            "-hide_banner",
-            "-loglevel", "error",
-            "-i", file_path,
-            "-ss", str(i),
-            "-t", str(chunk_length_sec),
-            "-ar", "16000",  # частота дискретизации
-            "-ac", "1",  # моно
-            tmp_path
-        ], check=True)
-        chunks.append(tmp_path)
-    return chunks
+        logger.debug(f"[run_ready_tasks] Задач к запуску: {len(due_task_ids)}")
+        for task_id in due_task_ids:
+            if claim_task(task_id):
+                run_task(task_id)
 
-@shared_task
-def process_task_file():
-    lock_name = "process_task_file_global_lock"
+        upcoming_tasks = Task.objects.filter(
+            RUNNABLE_TASKS,
+            next_run_at__gt=now,
+            next_run_at__lte=now + timedelta(seconds=settings.TASK_ETA_HORIZON_SEC),
+        )
+        for task in upcoming_tasks:
+            schedule_task_run(task)
 
-    with single_task_lock(lock_name) as acquired:
-        if not acquired:
-            logger.info("[process_task_file] Пропуск — другая задача уже выполняется")
-            return
+        finished_tasks = Task.objects.filter(status=Task.Status.PROCESSING, pending_files__lte=0)
+        for task_id in finished_tasks.values_list("id", flat=True):
+            finalize_task(task_id)
+
+
+class LeaseLost(Exception):
+    """Аренда файла истекла и его забрал reap_expired_leases — результат этого воркера не сохраняется."""
 
+
+def claim_task_file(task_file_id=None):
+    """
+    Атомарно захватывает NEW-файл задачи, находящейся в обработке: конкретный
+    (task_file_id) или следующий по очереди, и берёт его в аренду на TASK_FILE_LEASE_SEC.
+    SELECT ... FOR UPDATE SKIP LOCKED: параллельные воркеры получают разные файлы
+    и не ждут друг друга на одной строке. Блокируется только строка TaskFile,
+    строка задачи остаётся свободной для остальных файлов этой же задачи.
+    Файлы, отложенные после сбоя (available_at в будущем), пропускаются.
+    """
+    now = timezone.now()
+    with transaction.atomic():
         task_file = (
             TaskFile.objects
+            .select_for_update(skip_locked=True, of=("self",))
             .filter(task__status=Task.Status.PROCESSING, status=TaskFile.Status.NEW)
-            .first()
+            .filter(Q(available_at__isnull=True) | Q(available_at__lte=now))
+            # приоритет задачи, затем самые короткие файлы
+            .order_by("-task__priority", F("duration").asc(nulls_last=True), "created_at")
         )
+        if task_file_id is not None:
+            task_file = task_file.filter(id=task_file_id)
+        task_file = task_file.first()
+        if task_file is None:
+            return None
 
-        if not task_file:
-            logger.info("[process_task_file] Нет новых файлов для обработки")
+        task_file.status = TaskFile.Status.PROCESSING
+        task_file.lease_token = uuid.uuid4()
+        task_file.lease_expires_at = now + timedelta(seconds=settings.TASK_FILE_LEASE_SEC)
+        task_file.attempts += 1
+        task_file.save(update_fields=["status", "lease_token", "lease_expires_at", "attempts", "updated_at"])
+    return task_file
+
+
+def claim_short_task_files(limit):
+    """
+    Захватывает до limit коротких NEW-файлов (не длиннее TRANSCRIBE_MICROBATCH_MAX_SEC) одной арендой
+    для микробатча. В батч попадают только файлы задач с той же моделью, что у первого файла.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        candidates = list(
+            TaskFile.objects
+            .select_for_update(skip_locked=True, of=("self",))
+            .select_related("task")
+            .filter(
+                task__status=Task.Status.PROCESSING,
+                status=TaskFile.Status.NEW,
+                duration__lte=settings.TRANSCRIBE_MICROBATCH_MAX_SEC,
+            )
+            .filter(Q(available_at__isnull=True) | Q(available_at__lte=now))
+            .order_by("-task__priority", "duration", "created_at")[:limit]
+        )
+        if not candidates:
+            return []
+
+        # один батч — одна модель и одинаковые параметры декодирования
+        batch_key = (task_model_name(candidates[0].task), decoding_options(candidates[0].task))
+        task_files = [f for f in candidates if (task_model_name(f.task), decoding_options(f.task)) == batch_key]
+
+        lease_token = uuid.uuid4()
+        lease_expires_at = now + timedelta(seconds=settings.TASK_FILE_LEASE_SEC)
+        TaskFile.objects.filter(id__in=[f.id for f in task_files]).update(
+            status=TaskFile.Status.PROCESSING,
+            lease_token=lease_token,
+            lease_expires_at=lease_expires_at,
+            attempts=F("attempts") + 1,
+            updated_at=now,
+        )
+        for task_file in task_files:
+            task_file.status = TaskFile.Status.PROCESSING
+            task_file.lease_token = lease_token
+            task_file.lease_expires_at = lease_expires_at
+            task_file.attempts += 1
+    return task_files
+
+
+def extend_lease(lease_token):
+    """
+    Продлевает аренду (heartbeat) всех ещё не завершённых файлов, захваченных с этим
+    токеном: одного файла или всего микробатча. Если таких не осталось — LeaseLost.
+    """
+    expires_at = timezone.now() + timedelta(seconds=settings.TASK_FILE_LEASE_SEC)
+    extended = TaskFile.objects.filter(
+        status=TaskFile.Status.PROCESSING, lease_token=lease_token
+    ).update(lease_expires_at=expires_at)
+    if not extended:
+        raise LeaseLost(f"Аренда {lease_token} истекла")
+
+
+@contextmanager
+def lease_heartbeat(lease_token):
+    """
+    Пока файлы обрабатываются, фоновый поток раз в TASK_FILE_HEARTBEAT_SEC продлевает аренду —
+    даже если один чанк (или пачка чанков) распознаётся дольше срока аренды.
+    Токен передаётся значением: release_lease обнуляет lease_token у завершённого файла,
+    а продлевать нужно остальные файлы с этим токеном.
+    Возвращает Event, который выставляется, если аренду продлить не удалось.
+    """
+    stopped = threading.Event()
+    lost = threading.Event()
+
+    def beat():
+        try:
+            while not stopped.wait(settings.TASK_FILE_HEARTBEAT_SEC):
+                try:
+                    extend_lease(lease_token)
+                except LeaseLost:
+                    lost.set()
+                    return
+                except Exception:
+                    logger.exception(f"[lease_heartbeat] Не удалось продлить аренду {lease_token}")
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f"lease-{lease_token}", daemon=True)
+    thread.start()
+    try:
+        yield lost
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def release_lease(task_file):
+    """
+    Снимает аренду перед сохранением результата. Вызывается внутри транзакции:
+    строка остаётся заблокированной до коммита, и reaper не может забрать файл между
+    проверкой и записью. Если аренда уже не наша — LeaseLost, транзакция откатывается.
+    """
+    released = TaskFile.objects.filter(
+        id=task_file.id, status=TaskFile.Status.PROCESSING, lease_token=task_file.lease_token
+    ).update(lease_token=None, lease_expires_at=None)
+    if not released:
+        raise LeaseLost(f"Аренда файла {task_file.id} истекла")
+    task_file.lease_token = task_file.lease_expires_at = None
+
+
+def retry_delay(attempts):
+    return settings.TASK_FILE_RETRY_BACKOFF_SEC * 2 ** max(0, attempts - 1)
+
+
+def chunk_limits(batched):
+    """
+    Длина фиксированного чанка и предел VAD-сегмента, сек. BatchedInferencePipeline
+    распознаёт только первые WHISPER_WINDOW_SEC секунд клипа, поэтому при batch_size > 1
+    оба значения ограничиваются окном Whisper — иначе хвост чанка молча теряется.
+    """
+    chunk_length_sec = settings.TRANSCRIBE_CHUNK_LENGTH_SEC
+    max_segment_sec = settings.VAD_MAX_SEGMENT_SEC
+    if batched:
+        chunk_length_sec = min(chunk_length_sec, WHISPER_WINDOW_SEC)
+        max_segment_sec = min(max_segment_sec, WHISPER_WINDOW_SEC)
+    return chunk_length_sec, max_segment_sec
+
+
+def iter_file_chunks(file_path, report, start_sec=0.0, batched=False):
+    """Чанки файла для транскрипции в соответствии с TRANSCRIBE_SEGMENTATION, начиная с start_sec."""
+    chunk_length_sec, max_segment_sec = chunk_limits(batched)
+    if settings.TRANSCRIBE_SEGMENTATION == "fixed":
+        return iter_audio_chunks(file_path, chunk_length_sec=chunk_length_sec, start_sec=start_sec)
+    return iter_speech_chunks(
+        file_path,
+        report,
+        backend=settings.VAD_BACKEND,
+        max_segment_sec=max_segment_sec,
+        speech_pad_ms=settings.VAD_SPEECH_PAD_MS,
+        merge_gap_ms=settings.VAD_MERGE_GAP_MS,
+        start_sec=start_sec,
+    )
+
+
+def load_checkpoints(task_file, params_key):
+    """
+    Сохранённые чанки файла, распознанные с теми же параметрами, по порядку.
+    Чанки с другими параметрами (сменили модель, нарезку) уже не подходят и удаляются.
+    """
+    TaskFileCheckpoint.objects.filter(task_file=task_file).exclude(params_key=params_key).delete()
+    return list(TaskFileCheckpoint.objects.filter(task_file=task_file).order_by("index"))
+
+
+def save_checkpoints(checkpoints):
+    if checkpoints:
+        TaskFileCheckpoint.objects.bulk_create(checkpoints, ignore_conflicts=True)
+
+
+def get_parallel_processes(duration):
+    """Сколько процессов отдать под файл: параллельно распознаются только длинные файлы."""
+    processes = min(settings.TRANSCRIBE_PARALLEL_PROCESSES, settings.TRANSCRIBE_CPU_BUDGET)
+    if processes <= 1 or duration < settings.TRANSCRIBE_PARALLEL_MIN_SEC or not can_fork_processes():
+        return 1
+    return processes
+
+
+def get_batch_size(task):
+    return settings.WHISPER_BATCH_SIZE if task.batch_size is None else task.batch_size
+
+
+def task_model_name(task):
+    """Модель задачи: выбранная явно, иначе из профиля декодирования, иначе модель по умолчанию."""
+    _, profile = get_decoding_profile(task.decoding_profile)
+    return task.whisper_model or profile.get("model") or settings.WHISPER_DEFAULT_MODEL
+
+
+def decoding_options(task):
+    """Параметры model.transcribe из профиля декодирования задачи."""
+    _, profile = get_decoding_profile(task.decoding_profile)
+    profile.pop("model", None)
+    return profile
+
+
+def transcription_params(task):
+    """Всё, что влияет на текст результата. Входит в ключ кэша транскрипций."""
+    _, definition = get_model_definition(task_model_name(task))
+    batched = get_batch_size(task) > 1
+    chunk_length_sec, max_segment_sec = chunk_limits(batched)
+    params = {
+        "model": definition["model"],
+        "compute_type": definition.get("compute_type", "int8"),
+        "decoding": decoding_options(task),
+        "language": task.language,
+        "batched": batched,
+        "segmentation": settings.TRANSCRIBE_SEGMENTATION,
+    }
+    if settings.TRANSCRIBE_SEGMENTATION == "fixed":
+        params["chunk_length_sec"] = chunk_length_sec
+    else:
+        params["vad"] = {
+            "backend": settings.VAD_BACKEND,
+            "max_segment_sec": max_segment_sec,
+            "speech_pad_ms": settings.VAD_SPEECH_PAD_MS,
+            "merge_gap_ms": settings.VAD_MERGE_GAP_MS,
+        }
+    return params
+
+
+def finish_task_file(task_file, update_fields):
+    """
+    Сохраняет файл в конечном статусе (DONE/ERROR) и в той же транзакции уменьшает
+    счётчик незавершённых файлов задачи. На последнем файле задача сразу завершается.
+    """
+    with transaction.atomic():
+        release_lease(task_file)
+        task_file.save(update_fields=update_fields)
+        Task.objects.filter(id=task_file.task_id).update(
+            pending_files=F("pending_files") - 1,
+            failed_files=F("failed_files") + (1 if task_file.status == TaskFile.Status.ERROR else 0),
+        )
+    finalize_task(task_file.task_id)
+
+
+def restore_cached_language(task_file, cached):
+    language = cached.meta.get("language") or {}
+    task_file.language = language.get("code", task_file.task.language)
+    task_file.language_probability = language.get("probability")
+
+
+def language_meta(task_file):
+    """Язык результата для кэша: при попадании в кэш он восстанавливается в TaskFile."""
+    return {"language": {"code": task_file.language, "probability": task_file.language_probability}}
+
+
+def pin_language(task_file, chunks, detect, persist=True):
+    """
+    Определяет язык файла, если у задачи language="auto": один раз, по первому чанку
+    (при VAD — первому фрагменту речи), и пишет его в TaskFile (persist), чтобы все остальные
+    чанки и продолжение после сбоя шли с тем же языком. detect(audio) -> (язык, вероятность).
+    Возвращает итератор чанков (первый чанк в нём остаётся).
+    """
+    if task_file.task.language != Task.AUTO_LANGUAGE:
+        task_file.language, task_file.language_probability = task_file.task.language, None
+        return chunks
+    if task_file.language:
+        # язык уже определён при прошлой попытке
+        return chunks
+
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return iter(())
+    task_file.language, probability = detect(first.audio)
+    task_file.language_probability = round(probability, 4)
+    if persist:
+        TaskFile.objects.filter(pk=task_file.pk).update(
+            language=task_file.language, language_probability=task_file.language_probability
+        )
+    logger.info(
+        f"[process_task_file] Язык файла {task_file.id}: {task_file.language} "
+        f"(вероятность {task_file.language_probability:.2f})"
+    )
+    return chain_iterables([first], chunks)
+
+
+def segment_values(chunk, seg):
+    """Сегмент Whisper в порядке TranscriptSegment.FIELDS; время — от начала файла, а не чанка."""
+    return (
+        round(chunk.start + seg.start, 3),
+        round(chunk.start + seg.end, 3),
+        seg.text.strip(),
+        round(seg.avg_logprob, 4),
+        round(seg.no_speech_prob, 4),
+    )
+
+
+def fail_task_file(task_file, error):
+    task_file.status = TaskFile.Status.ERROR
+    task_file.error = str(error)
+    try:
+        finish_task_file(task_file, ["status", "error"])
+    except LeaseLost:
+        logger.warning(f"[process_task_file] Аренда файла {task_file.id} истекла, ошибку не сохраняем")
+
+
+def complete_task_file(task_file, result_text, segments=()):
+    """
+    Сохраняет результат и фрагменты (значения в порядке TranscriptSegment.FIELDS)
+    одним bulk_create, переводит файл в DONE и удаляет исходное аудио.
+    """
+    task_file.result_text = result_text
+    task_file.status = TaskFile.Status.DONE
+    task_file.error = ""
+    task_file.decoding_profile, _ = get_decoding_profile(task_file.task.decoding_profile)
+    with transaction.atomic():
+        TranscriptSegment.objects.filter(task_file=task_file).delete()
+        TaskFileCheckpoint.objects.filter(task_file=task_file).delete()
+        TranscriptSegment.objects.bulk_create(
+            [TranscriptSegment.from_values(task_file, values) for values in segments],
+            batch_size=FILL_BATCH_SIZE,
+        )
+        finish_task_file(
+            task_file,
+            ["result_text", "status", "error", "meta", "decoding_profile", "language", "language_probability"],
+        )
+        TaskFile.objects.filter(pk=task_file.pk).update_search_vector()
+
+    # Удаляем исходный файл (не из Filer-базы)
+    task_file.filer_file.file.delete(save=False)
+
+
+def transcribe_task_file(task_file, lease_lost):
+    """
+    Транскрибирует уже захваченный (PROCESSING) файл и сохраняет результат.
+    lease_lost — Event из lease_heartbeat: если аренду забрали, обработка прерывается.
+    """
+    logger.info(f"[process_task_file] Начинаем обработку файла {task_file.id}")
+
+    try:
+        file_path = task_file.filer_file.file.path
+        params = transcription_params(task_file.task)
+        audio_sha256 = file_sha256(file_path)
+        cache_key = transcript_cache_key(audio_sha256, params)
+
+        cached = get_cached_transcript(cache_key)
+        if cached is not None:
+            restore_cached_language(task_file, cached)
+            task_file.meta.update(cached.meta)
+            task_file.meta["cache"] = {"hit": True, "key": cache_key}
+            complete_task_file(task_file, cached.result_text, cached.segments)
+            logger.info(f"[process_task_file] Файл {task_file.id} взят из кэша транскрипций")
             return
 
-        logger.info(f"[process_task_file] Начинаем обработку файла {task_file.id}")
-        task_file.status = TaskFile.Status.PROCESSING
-        task_file.updated_at = timezone.now()
-        task_file.save(update_fields=["status", "updated_at"])
+        duration = task_file.duration or probe_duration(file_path)
+        logger.info(f"[process_task_file] Длительность файла {duration:.0f} с")
 
-        model = get_whisper_model()
+        # продолжаем с конца последнего сохранённого чанка, если файл уже начинали
+        checkpoints = load_checkpoints(task_file, cache_key)
+        full_text = [checkpoint.text for checkpoint in checkpoints]
+        timed_segments = [tuple(values) for checkpoint in checkpoints for values in checkpoint.segments]
+        resume_from = checkpoints[-1].end if checkpoints else 0.0
+        if checkpoints:
+            logger.info(
+                f"[process_task_file] Продолжаем файл {task_file.id} с {resume_from:.0f} с "
+                f"(сохранено частей: {len(checkpoints)})"
+            )
 
+        segmentation = {}
+        pending = []
+        chunks = iter_file_chunks(
+            file_path, segmentation, start_sec=resume_from, batched=get_batch_size(task_file.task) > 1
+        )
+        processes = get_parallel_processes(duration)
+        _, definition = get_model_definition(task_model_name(task_file.task))
+        model = None if processes > 1 else get_whisper_model(task_model_name(task_file.task))
+
+        def detect(audio):
+            if model is not None:
+                return detect_language(model, audio)
+            return detect_language_parallel(definition, processes, settings.TRANSCRIBE_CPU_BUDGET, audio)
+
+        chunks = pin_language(task_file, chunks, detect)
+        if processes > 1:
+            logger.info(f"[process_task_file] Распознаём файл в {processes} процессах")
+            results = transcribe_chunks_parallel(
+                definition, chunks, processes, settings.TRANSCRIBE_CPU_BUDGET,
+                get_batch_size(task_file.task), language=task_file.language, **decoding_options(task_file.task),
+            )
+        else:
+            results = transcribe_chunks(
+                model, chunks, get_batch_size(task_file.task),
+                language=task_file.language, log_progress=True, **decoding_options(task_file.task),
+            )
         try:
-            file_path = task_file.filer_file.file.path
-            logger.info(f"[process_task_file] <UNK> <UNK> <UNK> <UNK> {file_path}")
-            chunks = split_audio_ffmpeg(file_path, chunk_length_sec=30)
-            logger.info(f"[process_task_file] Разбито на {len(chunks)} частей")
-
-            full_text = []
-            for i, chunk_path in enumerate(chunks, start=1):
-                logger.info(f"[process_task_file] Обрабатываем часть {i}/{len(chunks)}")
-                segments, info = model.transcribe(chunk_path, language="ru", log_progress=True)
+            for i, (chunk, segments) in enumerate(results, start=len(checkpoints) + 1):
+                logger.info(
+                    f"[process_task_file] Обработана часть {i} ({chunk.start:.0f}–{chunk.end:.0f} из {duration:.0f} с)"
+                )
                 chunk_text = " ".join([seg.text for seg in segments])
                 full_text.append(chunk_text)
-                os.remove(chunk_path)
+                chunk_segments = [segment_values(chunk, seg) for seg in segments]
+                timed_segments.extend(chunk_segments)
 
-            result_text = " ".join(full_text)
+                pending.append(TaskFileCheckpoint(
+                    task_file=task_file,
+                    index=i - 1,
+                    params_key=cache_key,
+                    start=chunk.start,
+                    end=chunk.end,
+                    text=chunk_text,
+                    segments=chunk_segments,
+                ))
+                if len(pending) >= settings.TRANSCRIBE_CHECKPOINT_INTERVAL:
+                    save_checkpoints(pending)
+                    pending = []
 
+                if lease_lost.is_set():
+                    raise LeaseLost(f"Аренда файла {task_file.id} истекла")
+        finally:
+            # уже распознанное сохраняем и при ошибке: повторный запуск продолжит с этого места
+            if not lease_lost.is_set():
+                save_checkpoints(pending)
+
+        result_text = " ".join(full_text)
+        result_meta = language_meta(task_file)
+        if checkpoints:
+            result_meta["resumed_from_sec"] = round(resume_from, 2)
+        if segmentation:
+            logger.info(
+                f"[process_task_file] VAD: речь {segmentation['speech_sec']:.0f} с из {segmentation['total_sec']:.0f} с, "
+                f"пропущено {segmentation['skipped_sec']:.0f} с тишины"
+            )
+            result_meta["segmentation"] = segmentation
+
+        store_transcript(cache_key, audio_sha256, params, result_text, result_meta, timed_segments)
+        task_file.meta.update(result_meta)
+        task_file.meta["cache"] = {"hit": False, "key": cache_key}
+        complete_task_file(task_file, result_text, timed_segments)
+
+        logger.info(f"[process_task_file] Файл {task_file.id} успешно обработан")
+
+    except LeaseLost:
+        logger.warning(f"[process_task_file] Аренда файла {task_file.id} истекла, результат не сохраняем")
+
+    except Exception as e:
+        logger.exception(f"[process_task_file] Ошибка при обработке файла {task_file.id}: {e}")
+        fail_task_file(task_file, e)
+
+
+def clip_transcription_params(task):
+    """Параметры микробатча: клип распознаётся целиком, без нарезки на чанки и VAD."""
+    params = {
+        key: value for key, value in transcription_params(task).items()
+        if key not in ("vad", "chunk_length_sec")
+    }
+    params.update(segmentation="clip", batched=True)
+    return params
+
+
+def decode_clip(file_path):
+    """Короткий файл целиком, окнами Whisper по WHISPER_WINDOW_SEC (обычно одно окно)."""
+    return list(iter_audio_chunks(file_path, chunk_length_sec=WHISPER_WINDOW_SEC))
+
+
+def save_short_batch(results):
+    """
+    Сохраняет результаты микробатча: bulk_update файлов, один bulk_create сегментов,
+    счётчики задач одним UPDATE на задачу. Сохраняются только файлы, чью аренду
+    не забрал reaper. Возвращает сохранённые файлы.
+    """
+    now = timezone.now()
+    by_id = {task_file.id: (task_file, result_text, segments) for task_file, result_text, segments in results}
+    with transaction.atomic():
+        owned = set(
+            TaskFile.objects
+            .select_for_update()
+            .filter(
+                id__in=list(by_id),
+                status=TaskFile.Status.PROCESSING,
+                lease_token=results[0][0].lease_token,
+            )
+            .values_list("id", flat=True)
+        )
+        task_files = []
+        new_segments = []
+        for task_file_id in owned:
+            task_file, result_text, segments = by_id[task_file_id]
             task_file.result_text = result_text
             task_file.status = TaskFile.Status.DONE
             task_file.error = ""
-            task_file.save(update_fields=["result_text", "status", "error"])
+            task_file.decoding_profile, _ = get_decoding_profile(task_file.task.decoding_profile)
+            task_file.lease_token = task_file.lease_expires_at = None
+            task_file.updated_at = now
+            task_files.append(task_file)
+            new_segments.extend(TranscriptSegment.from_values(task_file, values) for values in segments)
+
+        TaskFile.objects.bulk_update(
+            task_files,
+            [
+                "result_text", "status", "error", "meta", "decoding_profile",
+                "language", "language_probability", "lease_token", "lease_expires_at", "updated_at",
+            ],
+            batch_size=FILL_BATCH_SIZE,
+        )
+        TranscriptSegment.objects.filter(task_file_id__in=owned).delete()
+        TaskFileCheckpoint.objects.filter(task_file_id__in=owned).delete()
+        TranscriptSegment.objects.bulk_create(new_segments, batch_size=FILL_BATCH_SIZE)
+        TaskFile.objects.filter(id__in=owned).update_search_vector()
 
-            # Удаляем исходный файл (не из Filer-базы)
-            task_file.filer_file.file.delete(save=False)
+        done_per_task = Counter(task_file.task_id for task_file in task_files)
+        for task_id, done in done_per_task.items():
+            Task.objects.filter(id=task_id).update(pending_files=F("pending_files") - done)
 
-            logger.info(f"[process_task_file] Файл {task_file.id} успешно обработан")
+    for task_id in done_per_task:
+        finalize_task(task_id)
+    return task_files
 
+
+def transcribe_short_batch(task_files, lease_lost):
+    """
+    Микробатч коротких файлов: кэш проверяется по каждому файлу, остальные декодируются
+    параллельно, проходят через модель одним батчем и сохраняются одной транзакцией.
+    Если батч целиком упал, файлы обрабатываются по одному обычным путём.
+    """
+    logger.info(f"[process_short_batch] Микробатч из {len(task_files)} файлов")
+
+    to_transcribe = []
+    for task_file in task_files:
+        try:
+            file_path = task_file.filer_file.file.path
+            params = clip_transcription_params(task_file.task)
+            audio_sha256 = file_sha256(file_path)
+            cache_key = transcript_cache_key(audio_sha256, params)
+            cached = get_cached_transcript(cache_key)
+            if cached is not None:
+                restore_cached_language(task_file, cached)
+                task_file.meta.update(cached.meta)
+                task_file.meta["cache"] = {"hit": True, "key": cache_key}
+                complete_task_file(task_file, cached.result_text, cached.segments)
+                continue
+            to_transcribe.append((task_file, file_path, audio_sha256, cache_key, params))
+        except LeaseLost:
+            logger.warning(f"[process_short_batch] Аренда файла {task_file.id} истекла")
         except Exception as e:
-            logger.exception(f"[process_task_file] Ошибка при обработке файла {task_file.id}: {e}")
-            task_file.status = TaskFile.Status.ERROR
-            task_file.error = str(e)
-            task_file.save(update_fields=["status", "error"])
\ No newline at end of file
+            logger.exception(f"[process_short_batch] Ошибка при подготовке файла {task_file.id}: {e}")
+            fail_task_file(task_file, e)
+
+    if not to_transcribe:
+        return
+
+    # декодирование — отдельные процессы ffmpeg, запускаем их параллельно
+    decoded = []
+    with ThreadPoolExecutor(max_workers=settings.TRANSCRIBE_PROBE_WORKERS) as executor:
+        futures = [executor.submit(decode_clip, item[1]) for item in to_transcribe]
+        for item, future in zip(to_transcribe, futures):
+            try:
+                decoded.append((item, future.result()))
+            except Exception as e:
+                logger.exception(f"[process_short_batch] Ошибка декодирования файла {item[0].id}: {e}")
+                fail_task_file(item[0], e)
+
+    if not decoded:
+        return
+
+    # в батче файлы задач с одинаковыми моделью и профилем (см. claim_short_task_files)
+    task = decoded[0][0][0].task
+    try:
+        model = get_whisper_model(task_model_name(task))
+        # язык клипа определяется по его первому окну; клипы одного языка идут одним батчем
+        by_language = defaultdict(list)
+        for index, ((task_file, *_), chunks) in enumerate(decoded):
+            pin_language(task_file, chunks, lambda audio: detect_language(model, audio), persist=False)
+            by_language[task_file.language].append(index)
+
+        texts = [[] for _ in decoded]
+        segments = [[] for _ in decoded]
+        for language, indices in by_language.items():
+            owners = [index for index in indices for _ in decoded[index][1]]
+            results = transcribe_chunks(
+                model,
+                (chunk for index in indices for chunk in decoded[index][1]),
+                max(2, settings.TRANSCRIBE_MICROBATCH_SIZE),
+                language=language,
+                **decoding_options(task),
+            )
+            for owner, (chunk, chunk_segments) in zip(owners, results):
+                texts[owner].append(" ".join(seg.text for seg in chunk_segments))
+                segments[owner].extend(segment_values(chunk, seg) for seg in chunk_segments)
+        if lease_lost.is_set():
+            raise LeaseLost("Аренда микробатча истекла")
+    except LeaseLost:
+        logger.warning("[process_short_batch] Аренда микробатча истекла, результаты не сохраняем")
+        return
+    except Exception as e:
+        logger.exception(f"[process_short_batch] Ошибка микробатча, обрабатываем файлы по одному: {e}")
+        for (task_file, *_), _ in decoded:
+            transcribe_task_file(task_file, lease_lost)
+        return
+
+    results = []
+    for index, ((task_file, _, audio_sha256, cache_key, params), _) in enumerate(decoded):
+        result_text = " ".join(texts[index])
+        result_meta = {"microbatch": True, **language_meta(task_file)}
+        store_transcript(cache_key, audio_sha256, params, result_text, result_meta, segments[index])
+        task_file.meta["microbatch"] = True
+        task_file.meta["cache"] = {"hit": False, "key": cache_key}
+        results.append((task_file, result_text, segments[index]))
+
+    saved = save_short_batch(results) if results else []
+    if len(saved) < len(results):
+        logger.warning(f"[process_short_batch] Аренда истекла у {len(results) - len(saved)} файлов, их результаты не сохранены")
+    for task_file in saved:
+        # Удаляем исходный файл (не из Filer-базы)
+        task_file.filer_file.file.delete(save=False)
+    logger.info(f"[process_short_batch] Микробатч обработан: сохранено файлов {len(saved)}")
+
+
+@shared_task
+def process_task_file(task_file_id=None):
+    """
+    Обрабатывает один файл.
+    С task_file_id — конкретный файл: такие задания ставятся в очередь при создании TaskFile.
+    Без него — следующий NEW-файл: это страховочный проход по beat для файлов,
+    чьё задание потерялось. Обработав файл, он сразу ставит в очередь следующий проход,
+    пока NEW-файлы не закончатся.
+    """
+    task_file = claim_task_file(task_file_id)
+    if task_file is None:
+        if task_file_id is None:
+            logger.info("[process_task_file] Нет новых файлов для обработки")
+        else:
+            logger.info(f"[process_task_file] Файл {task_file_id} уже захвачен или не готов к обработке")
+        return
+
+    with lease_heartbeat(task_file.lease_token) as lease_lost:
+        transcribe_task_file(task_file, lease_lost)
+
+    if task_file_id is None:
+        process_task_file.delay()
+
+
+@shared_task
+def process_short_batch():
+    """
+    Микробатч: до TRANSCRIBE_MICROBATCH_SIZE коротких файлов одним проходом модели.
+    В батч берутся файлы одной модели и профиля, так что заданий от dispatch_task_files
+    может не хватить на все клипы: обработав батч, задание ставит в очередь следующее,
+    пока короткие файлы не закончатся.
+    """
+    task_files = claim_short_task_files(settings.TRANSCRIBE_MICROBATCH_SIZE)
+    if not task_files:
+        logger.info("[process_short_batch] Нет коротких файлов для обработки")
+        return
+
+    with lease_heartbeat(task_files[0].lease_token) as lease_lost:
+        transcribe_short_batch(task_files, lease_lost)
+
+    process_short_batch.apply_async(queue="transcribe_short", priority=9 - task_files[0].task.priority)
+
+
+@celery_app.task
+def clean_transcript_cache():
+    evict_transcript_cache()
+
+
+def reap_task_file(task_file, now):
+    """Файл с истёкшей арендой: обратно в очередь с задержкой или, если попытки кончились, в ERROR."""
+    if task_file.attempts >= settings.TASK_FILE_MAX_ATTEMPTS:
+        logger.warning(f"[reap_expired_leases] Файл {task_file.id}: попытки исчерпаны ({task_file.attempts})")
+        task_file.status = TaskFile.Status.ERROR
+        task_file.error = f"Обработка прерывалась {task_file.attempts} раз(а): аренда истекла"
+        task_file.lease_token = task_file.lease_expires_at = None
+        task_file.save(update_fields=["status", "error", "lease_token", "lease_expires_at", "updated_at"])
+        Task.objects.filter(id=task_file.task_id).update(
+            pending_files=F("pending_files") - 1, failed_files=F("failed_files") + 1
+        )
+        transaction.on_commit(lambda: finalize_task(task_file.task_id))
+        return
+
+    delay = retry_delay(task_file.attempts)
+    logger.warning(
+        f"[reap_expired_leases] Файл {task_file.id}: аренда истекла, повтор через {delay} с "
+        f"(попытка {task_file.attempts} из {settings.TASK_FILE_MAX_ATTEMPTS})"
+    )
+    task_file.status = TaskFile.Status.NEW
+    task_file.lease_token = task_file.lease_expires_at = None
+    task_file.available_at = now + timedelta(seconds=delay)
+    task_file.save(update_fields=["status", "lease_token", "lease_expires_at", "available_at", "updated_at"])
+    # секунда запаса, чтобы задание не пришло раньше available_at
+    transaction.on_commit(lambda: enqueue_task_file(
+        task_file.id, task_file.duration, task_file.task.priority, countdown=delay + 1
+    ))
+
+
+@celery_app.task
+def reap_expired_leases():
+    """
+    Возвращает в работу файлы, чей воркер упал или завис (аренда не продлевалась),
+    и переводит в ERROR задачи, зависшие на подготовке дольше TASK_PREPARE_TIMEOUT_SEC.
+    """
+    now = timezone.now()
+    expired = Q(lease_expires_at__lt=now) | Q(
+        # файлы, захваченные до появления аренды
+        lease_expires_at__isnull=True, updated_at__lt=now - timedelta(seconds=settings.TASK_FILE_LEASE_SEC)
+    )
+    with transaction.atomic():
+        task_files = (
+            TaskFile.objects
+            .select_for_update(skip_locked=True, of=("self",))
+            .select_related("task")
+            .filter(expired, status=TaskFile.Status.PROCESSING)
+        )
+        for task_file in task_files:
+            reap_task_file(task_file, now)
+
+    stuck_tasks = Task.objects.filter(
+        status=Task.Status.PROCESSING_FILLED_FILES,
+        updated_at__lt=now - timedelta(seconds=settings.TASK_PREPARE_TIMEOUT_SEC),
+    )
+    for task_id in stuck_tasks.values_list("id", flat=True):
+        logger.warning(f"[reap_expired_leases] Задача {task_id} зависла на подготовке")
+    stuck_tasks.update(
+        status=Task.Status.ERROR, last_error="Подготовка задачи не завершилась: воркер упал или завис"
+    )
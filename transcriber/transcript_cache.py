@@ -0,0 +1,69 @@
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from transcriber.models import TranscriptCache
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(file_path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def transcript_cache_key(audio_sha256, params):
+    """Ключ кэша: хэш аудио + всё, что влияет на результат распознавания."""
+    payload = json.dumps({"audio": audio_sha256, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_cached_transcript(key):
+    """Запись кэша по ключу (с обновлением времени использования) или None."""
+    if not settings.TRANSCRIPT_CACHE_ENABLED:
+        return None
+    entry = TranscriptCache.objects.filter(key=key).first()
+    if entry is not None:
+        TranscriptCache.objects.filter(pk=entry.pk).update(last_used_at=timezone.now())
+    return entry
+
+
+def store_transcript(key, audio_sha256, params, result_text, meta=None, segments=()):
+    if not settings.TRANSCRIPT_CACHE_ENABLED:
+        return
+    TranscriptCache.objects.update_or_create(
+        key=key,
+        defaults={
+            "audio_sha256": audio_sha256,
+            "params": params,
+            "result_text": result_text,
+            "segments": [list(segment) for segment in segments],
+            "meta": meta or {},
+            "last_used_at": timezone.now(),
+        },
+    )
+
+
+def evict_transcript_cache():
+    """Удаляет записи старше TRANSCRIPT_CACHE_MAX_AGE_DAYS и самые давние сверх TRANSCRIPT_CACHE_MAX_ENTRIES."""
+    cutoff = timezone.now() - timedelta(days=settings.TRANSCRIPT_CACHE_MAX_AGE_DAYS)
+    expired, _ = TranscriptCache.objects.filter(last_used_at__lt=cutoff).delete()
+
+    overflow = 0
+    limit = settings.TRANSCRIPT_CACHE_MAX_ENTRIES
+    # last_used_at первой записи, не влезающей в лимит: она и всё, что старше, удаляется
+    boundary = next(iter(
+        TranscriptCache.objects.order_by("-last_used_at").values_list("last_used_at", flat=True)[limit:limit + 1]
+    ), None)
+    if boundary is not None:
+        overflow, _ = TranscriptCache.objects.filter(last_used_at__lte=boundary).delete()
+
+    logger.info(f"[evict_transcript_cache] Удалено записей: по возрасту {expired}, сверх лимита {overflow}")
+    return expired + overflow